@@ -57,24 +57,47 @@ LIFE_SAVING = True                         # if true, the AI will, when possible
 LIFE_SAVING_PENALTY = -5                   # penalty on the score when the life saving feature is used by the AI
 LIFE_SAVING_COOLDOWN = 0                   # cooldown for the life saving feature
 MAX_NO_FOOD_TURNS = 200                    # max number of turns the AI can survive without eating
+CURRICULUM = []                            # optional easier stages played first (see evolution/curriculum.py)
+                                           #
+EPISODE_TIME_BUDGET = None                 # max wall-clock time (in seconds) of a game (None: no limit; see evolution/budget.py)
+GENERATION_TIME_BUDGET = None              # max wall-clock time (in seconds) of the games of a generation (None: no limit)
+GENERATION_TURN_BUDGET = None              # max number of turns of the games of a generation (None: no limit)
+BUDGET_CHECK_TURNS = 256                   # number of turns between the checks of the budgets
+                                           #
+OPTIMIZER = "ga"                           # "ga" (genetic algorithm), "cmaes", "sep_cmaes" or "openai_es"
+OPTIMIZER_SIGMA = 0.1                      # initial step size of the "cmaes", "sep_cmaes" and "openai_es" optimizers
+ES_LEARNING_RATE = 0.01                    # learning rate of the "openai_es" optimizer
                                            #
 MIN_MUTATION_RATE = 0.01                   # minimum mutation rate for the genetic algorithm
 MAX_MUTATION_RATE = 0.5                    # maximum mutation rate for the genetic algorithm
                                            #
 WEIGHTS_MULT_FACTOR = 1                    # factor that multiplies the weights of a newly created neural network
 BRAIN_FORMAT = [32]                        # number of hidden layers and neurons in each hidden layer
+BRAIN_DTYPE = "float64"                    # data type of the weights ("float64", "float32" or "float16")
+BRAIN_WEIGHTS_FORMAT = "dense"             # storage of the weights: "dense", "csr" (sparse) or "int8" (quantized)
+BRAIN_DENSITY = 1.0                        # fraction of the connections kept in each layer of "csr" brains
+RECURRENT_BRAIN = False                    # whether the hidden layers of the brains are recurrent (Elman)
                                            #
 RANDOM_KILL_PC = 0.1                       # predatism percentage
 MASS_EXTINCTION_THRESHOLD = 40             # max number of turns allowed without improvements in the score
                                            #
+NOVELTY_WEIGHT = 0.0                       # weight of novelty in selection (0 disables novelty search)
+NOVELTY_K = 10                             # number of nearest neighbours used to compute novelty
+NOVELTY_GRID = 4                           # the board is split in GRID x GRID regions for the behaviour descriptor
+NOVELTY_ARCHIVE_PROB = 0.05                # probability of an individual's behaviour being archived
+NOVELTY_ARCHIVE_SIZE = 5000                # max number of behaviours in the novelty archive
+                                           #
 CLOSER_TO_FOOD_SCORE = 1                   # score gained when the snake moves towards the food
 FARTHER_FROM_FOOD_SCORE = -1               # score lost when the snake moves away from the food
                                            #
+FEATURE_ENCODER = "window"                 # input of the AI's brain: "window", "raycast" or "egocentric"
 SIGHT_RADIUS = 3                           # number of tiles/cells around the snake's head the AI will take into account
-NUM_CELLS = (2*SIGHT_RADIUS + 1)**2        #
-NUM_FEATURES = NUM_CELLS + 3               #
                                            #
 BASE_OUT_DIR = "./evolution/populations/"  #
+SEED = None                                # seed of the run's random numbers (None: a random one, see info.txt)
+METRICS_FLUSH_GENERATIONS = 5              # number of generations buffered before the metrics and models are written to disk
+MEMORY_PROFILING = False                   # if true, the memory usage of each generation is written to memory.jsonl (slow!)
+MEMORY_TOP_SITES = 10                      # number of allocation sites reported by the memory profiling
 ############################################
 
 FOOD_POS_LIST = [    # optional
@@ -0,0 +1,146 @@
+""" Headless evaluation of the best models saved during the evolution of a population.
+
+Every model in the population's "best_models" directory plays the same bank of seeded games (the food is placed in the
+same way as long as the snakes move in the same way), so the models are compared on equal terms, with many more games
+than the few played during training. Each distinct model is evaluated once, even if it was the best one of several
+generations (see neural_network/model_store.py). The models are evaluated in parallel and the results are written,
+sorted by the mean score, to "leaderboard.csv" in the population's directory.
+
+Usage examples:
+    python evaluate.py ./evolution/populations/sample_pop/
+    python evaluate.py ./evolution/populations/pop_1/ --games 200 --processes 16 --top 20
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+import argparse
+import csv
+import multiprocessing
+import os
+import time
+from collections import Counter
+from functools import partial
+
+import numpy as np
+
+from evolution.batch_runner import load_run_config, to_run_config
+from evolution.novelty import END_CAUSES
+from evolution.snake_ai import SnakeAI, play_game, read_population_info
+from neural_network.neural_network import NeuralNetwork
+from neural_network.model_store import ModelStore
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scores every saved model of a population on a fixed bank of games.")
+    parser.add_argument("pop_dir", help="the population's output directory")
+    parser.add_argument("--games", type=int, default=100, help="number of games (seeds) played by each model")
+    parser.add_argument("--seed", type=int, default=0, help="first seed of the bank of games")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--config", default=None,
+                        help="JSON run configuration file with the settings of the games (default: the ones in the "
+                             "population's info.txt and config.py)")
+    parser.add_argument("--out", default=None, help="path of the leaderboard (default: <pop_dir>/leaderboard.csv)")
+    parser.add_argument("--top", type=int, default=10, help="number of models printed at the end")
+    return parser.parse_args(argv)
+
+
+def find_models(models_dir):
+    """ Returns a list of (generations, path) tuples with the distinct models in the given directory, sorted by the first
+    generation of each model (the generations in which a model was the best one are listed in the tuple). """
+    store = ModelStore(models_dir)
+    models = {}
+    for gen in store.generations():
+        models.setdefault(store.path(gen), []).append(gen)
+    return sorted(((gens, pathname) for pathname, gens in models.items()), key=lambda m: m[0][0])
+
+
+def evaluate_model(model, run_config, seeds):
+    """ Makes a model play one game per seed.
+
+    :param model: tuple containing the model's generations and the path to its file.
+    :param run_config: the RunConfig with the settings of the games.
+    :param seeds: the bank of seeds.
+    :return: a tuple containing the model's generations, a vector with its scores, a vector with the number of turns
+    of each game and a Counter with the reasons why the games ended.
+    """
+    gens, pathname = model
+    brain = NeuralNetwork.load(pathname)
+    scores, turns, end_causes = np.zeros(len(seeds)), np.zeros(len(seeds), dtype=np.int64), Counter()
+    for i, seed in enumerate(seeds):
+        snake = SnakeAI(brain, run_config=run_config)
+        turns[i], _, end_cause = play_game(snake, run_config, seed=seed)
+        scores[i] = snake.score
+        end_causes[end_cause] += 1
+
+    return gens, scores, turns, end_causes
+
+
+def summarize(gens, scores, turns, end_causes):
+    """ Returns a row of the leaderboard: summary statistics of a model's scores (with a 95% confidence interval for
+    the mean, using the normal approximation), its mean number of turns and the fraction of games ended by each
+    cause. """
+    n = len(scores)
+    std = float(scores.std(ddof=1)) if n > 1 else 0.0
+    half_width = 1.96 * std / np.sqrt(n)
+    row = {
+        "generation": gens[0],
+        "last_generation": gens[-1],
+        "mean": float(scores.mean()),
+        "ci_low": float(scores.mean() - half_width),
+        "ci_high": float(scores.mean() + half_width),
+        "std": std,
+        "median": float(np.median(scores)),
+        "min": float(scores.min()),
+        "max": float(scores.max()),
+        "mean_turns": float(turns.mean()),
+    }
+    for cause in END_CAUSES:
+        row[cause] = end_causes[cause] / n
+
+    return row
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    run_config, _ = read_population_info(args.pop_dir)
+    if args.config is not None:
+        run_config = to_run_config(load_run_config(args.config))
+
+    models = find_models(os.path.join(args.pop_dir, "best_models"))
+    if len(models) == 0:
+        print("No models found in \"%s\"!" % os.path.join(args.pop_dir, "best_models"))
+        return
+
+    processes = args.processes if args.processes is not None else multiprocessing.cpu_count()
+    seeds = list(range(args.seed, args.seed + args.games))
+    print("Evaluating %d distinct models (%d generations) on %d games each, with %d processes..." % (
+        len(models), sum(len(gens) for gens, _ in models), len(seeds), processes))
+
+    start_time = time.time()
+    rows = []
+    with multiprocessing.Pool(processes=processes) as pool:
+        results = pool.imap_unordered(partial(evaluate_model, run_config=run_config, seeds=seeds), models,
+                                      chunksize=max(1, len(models) // (4 * processes)))
+        for result in results:
+            rows.append(summarize(*result))
+            print("\r    %d/%d models evaluated" % (len(rows), len(models)), end="")
+    print("\nDone in %.2fs." % (time.time() - start_time))
+
+    rows.sort(key=lambda r: (-r["mean"], r["generation"]))
+    out = args.out if args.out is not None else os.path.join(args.pop_dir, "leaderboard.csv")
+    with open(out, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=["rank"] + list(rows[0]))
+        writer.writeheader()
+        for rank, row in enumerate(rows, start=1):
+            writer.writerow({"rank": rank, **row})
+
+    print("\n%4s  %6s  %10s  %21s  %s" % ("RANK", "GEN", "MEAN", "95% CI", "  ".join(END_CAUSES)))
+    for rank, row in enumerate(rows[:args.top], start=1):
+        print("%4d  %6d  %10.2f  [%9.2f, %9.2f]  %s" % (
+            rank, row["generation"], row["mean"], row["ci_low"], row["ci_high"],
+            "  ".join("%*.0f%%" % (len(c) - 1, 100*row[c]) for c in END_CAUSES)))
+    print("\nLeaderboard saved to: \"%s\"" % out)
+
+
+if __name__ == "__main__":
+    main()
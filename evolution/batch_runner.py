@@ -0,0 +1,178 @@
+""" Runs batches of evolution jobs described by configuration files, without any GUI.
+
+A run configuration is a JSON object whose keys are the names of the settings in config.py covered by RunConfig (for
+example "BRAIN_FORMAT", "SIGHT_RADIUS" or "MAX_MUTATION_RATE"), plus the following run-specific keys:
+
+    SIZE         number of individuals in the population (required);
+    GENERATIONS  number of generations to evolve (required);
+    BASE_MODEL   optional path to a saved model used as the initial best individual;
+    PROCESSES    optional number of cores the run will use (defaults to min(SIZE * PLAYS_PER_GEN, core budget)).
+
+A sweep file is a JSON object with a "base" run configuration, a "grid" mapping setting names to lists of values and an
+optional "repeats" count. One run is created for each combination of the grid's values (cartesian product).
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+from run_config import RunConfig
+import config
+
+from datetime import datetime
+from pathlib import Path
+import itertools
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import sys
+
+
+RUN_KEYS = ("SIZE", "GENERATIONS", "BASE_MODEL", "PROCESSES")
+
+
+def load_run_config(pathname):
+    """ Loads and validates a run configuration from a JSON file. """
+    with open(pathname, "r") as file:
+        run_config = json.load(file)
+
+    validate_run_config(run_config)
+    return run_config
+
+
+def validate_run_config(run_config):
+    """ Raises a ValueError if the given run configuration is malformed. """
+    for key in ("SIZE", "GENERATIONS"):
+        if key not in run_config:
+            raise ValueError("Missing required key \"%s\" in run configuration!" % key)
+
+    settings = RunConfig.field_names()
+    for key in run_config:
+        if key not in RUN_KEYS and key not in settings:
+            raise ValueError("Unknown setting \"%s\" in run configuration!" % key)
+
+
+def load_sweep(pathname):
+    """ Loads a sweep file and expands it into a list of run configurations. """
+    with open(pathname, "r") as file:
+        return expand_sweep(json.load(file))
+
+
+def expand_sweep(sweep):
+    """ Expands a sweep description into a list of run configurations.
+
+    :param sweep: dictionary with the keys "base" (run configuration shared by all runs), "grid" (maps setting names to
+    the list of values to be tried) and, optionally, "repeats" (number of runs for each combination). If a SEED is set,
+    the repeats of a combination use consecutive seeds.
+    :return: a list with one run configuration (dictionary) per run.
+    """
+    base = sweep.get("base", {})
+    grid = sweep.get("grid", {})
+    repeats = sweep.get("repeats", 1)
+
+    keys = list(grid.keys())
+    runs = []
+    for values in itertools.product(*[grid[k] for k in keys]):
+        run_config = dict(base)
+        run_config.update(zip(keys, values))
+        validate_run_config(run_config)
+        seed = run_config.get("SEED")
+        runs.extend([dict(run_config, SEED=seed + r) if seed is not None else dict(run_config) for r in range(repeats)])
+
+    return runs
+
+
+def to_run_config(run_config):
+    """ Creates a RunConfig from the settings of the given run configuration (dictionary). Settings not specified in it
+    are read from config.py. """
+    return RunConfig.from_config({k: v for k, v in run_config.items() if k not in RUN_KEYS})
+
+
+def _run_process(run_config, out_dir, processes):
+    """ Executes a single run. Called in a child process, so each run's output goes to its own log file. """
+    from evolution.snake_ai import SnakePopulation
+    from neural_network.neural_network import NeuralNetwork
+
+    sys.stdout = open(out_dir + "log.txt", "w", buffering=1)
+
+    base_model = run_config.get("BASE_MODEL", None)
+    pop = SnakePopulation(size=run_config["SIZE"],
+                          pre_trained_brain=None if base_model is None else NeuralNetwork.load(base_model),
+                          out_dir=out_dir, processes=processes, run_config=to_run_config(run_config))
+    pop.evolve(run_config["GENERATIONS"])
+
+
+class BatchRunner:
+    """ Schedules many evolution runs concurrently across a shared budget of CPU cores.
+
+    Each run is executed in its own process and uses a pool of workers of its own. A run requests as many cores as it
+    can keep busy (at most one per game played in a generation, since each game is simulated by a single task), so small
+    runs are packed together in the budget. Pending runs are started largest first, whenever enough cores are free.
+    """
+
+    def __init__(self, runs, cores=None, out_dir=None):
+        """ Constructor.
+
+        :param runs: list of run configurations (dictionaries).
+        :param cores: total number of cores shared by all the runs. Defaults to the number of CPUs.
+        :param out_dir: directory in which each run's results will be saved (in a subdirectory of its own).
+        """
+        self._runs = runs
+        self._cores = cores if cores is not None else multiprocessing.cpu_count()
+        self._out_dir = out_dir if out_dir is not None else \
+            config.BASE_OUT_DIR + "sweep_" + f"{datetime.now():%y_%m_%d_%H_%M_%S}" + "/"
+        if not self._out_dir.endswith("/"):
+            self._out_dir += "/"
+
+    def _run_dir(self, index):
+        """ Returns the directory where the results of the run with the given index are saved. """
+        return self._out_dir + "run_%d/" % index
+
+    def _cores_needed(self, run_config):
+        cores = run_config.get("PROCESSES", run_config["SIZE"] * to_run_config(run_config).plays_per_gen)
+        return max(1, min(cores, self._cores))
+
+    def run(self):
+        """ Executes all the runs, blocking until they are finished.
+
+        :return: a list with the exit code of each run's process, in the same order as the runs.
+        :raises FileExistsError: if the output directory already contains the results of any of the runs (checked
+        before any run starts).
+        """
+        existing = [d for d in (self._run_dir(i) for i in range(len(self._runs))) if os.path.exists(d)]
+        if len(existing) > 0:
+            raise FileExistsError("The output directory already contains the results of %d run(s) (e.g. \"%s\")! "
+                                  "Choose another directory." % (len(existing), existing[0]))
+
+        Path(self._out_dir).mkdir(parents=True, exist_ok=True)
+        pending = sorted(range(len(self._runs)), key=lambda i: self._cores_needed(self._runs[i]), reverse=True)
+        running = {}  # maps a process' sentinel to (run index, process, cores)
+        exit_codes = [None] * len(self._runs)
+        free_cores = self._cores
+
+        while len(pending) > 0 or len(running) > 0:
+            # first-fit: starting every pending run that fits in the free cores
+            for i in list(pending):
+                cores = self._cores_needed(self._runs[i])
+                if cores <= free_cores:
+                    run_dir = self._run_dir(i)
+                    Path(run_dir).mkdir(parents=True)
+                    with open(run_dir + "run_config.json", "w") as file:
+                        json.dump(self._runs[i], file, indent=4)
+
+                    proc = multiprocessing.Process(target=_run_process, args=(self._runs[i], run_dir, cores))
+                    proc.start()
+                    running[proc.sentinel] = (i, proc, cores)
+                    free_cores -= cores
+                    pending.remove(i)
+                    print("Started run %d using %d core(s). Results: \"%s\"" % (i, cores, run_dir))
+
+            # waiting for at least one run to finish
+            for sentinel in multiprocessing.connection.wait(list(running.keys())):
+                i, proc, cores = running.pop(sentinel)
+                proc.join()
+                exit_codes[i] = proc.exitcode
+                free_cores += cores
+                print("Run %d finished (exit code %d). %d run(s) pending, %d running." %
+                      (i, proc.exitcode, len(pending), len(running)))
+
+        return exit_codes
@@ -0,0 +1,114 @@
+""" Wall-clock and turn budgets of the games played during the evolution.
+
+A snake that learns to loop safely while eating once in a while can play for MAX_TURNS turns, and the whole generation
+waits for that single game. Budgets bound the time spent on each game and on each generation:
+
+    EPISODE_TIME_BUDGET     wall-clock time of a game;
+    GENERATION_TIME_BUDGET  wall-clock time of all the games of a generation;
+    GENERATION_TURN_BUDGET  number of turns of all the games of a generation (counted across the worker processes).
+
+(The number of turns of a game is already bounded by MAX_TURNS.) The budgets are checked cooperatively by the games,
+every BUDGET_CHECK_TURNS turns, so every game plays at least that many turns (or until it ends), even when the budgets of
+the generation were already spent when it started.
+
+A game stopped by a budget (preempted) ends as if it had reached the turn limit: the snake keeps the score obtained so
+far, without any penalty, and the game's end cause is "budget". Since the budgets of a generation are shared by all its
+games and the wall-clock budgets depend on the speed of the machine, a run whose budgets are hit isn't reproducible.
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+import ctypes
+import math
+import multiprocessing
+import time
+
+
+# reasons why a game is preempted
+PREEMPTION_REASONS = ("episode_time", "generation_time", "generation_turns")
+
+
+class GenerationBudget:
+    """ Budgets shared by all the games of a generation, in all the worker processes.
+
+    Created by the main process and passed to the workers when they are started (e.g. as an argument of the initializer
+    of a pool). The main process calls start() at the beginning of each generation.
+    """
+
+    def __init__(self, max_turns=None, max_seconds=None):
+        """ Constructor.
+
+        :param max_turns: maximum number of turns played in the games of a generation (None: no limit).
+        :param max_seconds: maximum wall-clock time of the games of a generation (None: no limit).
+        """
+        self._max_turns = max_turns if max_turns is not None else math.inf
+        self._max_seconds = max_seconds
+        self._turns = multiprocessing.Value(ctypes.c_int64, 0)
+        self._deadline = multiprocessing.Value(ctypes.c_double, math.inf)
+
+    def start(self):
+        """ Starts the budgets of a new generation. """
+        self._turns.value = 0
+        self._deadline.value = time.time() + self._max_seconds if self._max_seconds is not None else math.inf
+
+    @property
+    def turns(self):
+        """ Returns the number of turns reported by the games of the current generation so far. """
+        return self._turns.value
+
+    def spend(self, turns):
+        """ Reports turns played by a game and returns the reason why the generation's budgets are exhausted (None if
+        they aren't). """
+        with self._turns.get_lock():
+            self._turns.value += turns
+            total = self._turns.value
+
+        if total >= self._max_turns:
+            return "generation_turns"
+        if time.time() >= self._deadline.value:
+            return "generation_time"
+        return None
+
+
+class EpisodeBudget:
+    """ Budgets of a single game. Checked by play_game() (see exhausted()). """
+
+    def __init__(self, run_config, generation=None):
+        """ Constructor.
+
+        :param run_config: the RunConfig with the settings of the game (EPISODE_TIME_BUDGET and BUDGET_CHECK_TURNS).
+        :param generation: optional GenerationBudget shared by the games of the generation.
+        """
+        self._check_turns = run_config.budget_check_turns
+        self._max_seconds = run_config.episode_time_budget if run_config.episode_time_budget is not None else math.inf
+        self._generation = generation
+        self._deadline = math.inf
+        self._next_check = self._reported = 0
+        self.reason = None  # why the game was preempted (one of PREEMPTION_REASONS), if it was
+
+    def start(self):
+        """ Starts the budgets of a new game. """
+        self._deadline = time.time() + self._max_seconds
+        self._next_check = self._check_turns
+        self._reported = 0
+        self.reason = None
+
+    def exhausted(self, turn):
+        """ Returns whether the game must be stopped, given the number of turns played so far. The budgets are only
+        checked every BUDGET_CHECK_TURNS turns. """
+        if turn < self._next_check:
+            return False
+
+        self._next_check = turn + self._check_turns
+        if self._generation is not None:
+            self.reason = self._generation.spend(turn - self._reported)
+            self._reported = turn
+        if self.reason is None and time.time() >= self._deadline:
+            self.reason = "episode_time"
+        return self.reason is not None
+
+    def finish(self, turn):
+        """ Reports the turns of the game not reported yet to the generation's budget. Called when the game ends. """
+        if self._generation is not None and turn > self._reported:
+            self._generation.spend(turn - self._reported)
+            self._reported = turn
@@ -0,0 +1,87 @@
+""" Curriculum of increasingly harder games for the evolution.
+
+Early in a run, most individuals play randomly and waste a lot of turns on big boards. With a curriculum, the population
+first plays on easier settings (e.g. smaller boards and shorter turn budgets) and moves on to the next stage once it
+performs well enough. After the last stage, the run's own settings are used.
+
+The stages are set in the CURRICULUM setting, as a list of dictionaries with the settings of each stage (a subset of
+STAGE_KEYS) and the score the population must reach to advance ("ADVANCE_SCORE"). Example:
+
+    CURRICULUM = [
+        {"BOARD_SIZE": [12, 12], "MAX_TURNS": 1000, "MAX_NO_FOOD_TURNS": 100, "ADVANCE_SCORE": 300},
+        {"BOARD_SIZE": [30, 20], "MAX_TURNS": 5000, "MAX_NO_FOOD_TURNS": 300, "ADVANCE_SCORE": 1000},
+    ]
+
+The population's score is measured by the 90th percentile of its individuals' scores, which isn't sensitive to a single
+lucky individual. A stage without "ADVANCE_SCORE" is never left.
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+import json
+
+
+# settings that can be changed by the stages of a curriculum (they don't affect the format of the brains)
+STAGE_KEYS = ("BOARD_SIZE", "MAX_TURNS", "MAX_NO_FOOD_TURNS", "FOOD_SPAWN_MIN_DIST")
+
+
+class Curriculum:
+    """ Keeps track of the current stage of a curriculum and of the generations in which each stage was reached. """
+
+    def __init__(self, stages, run_config):
+        """ Constructor.
+
+        :param stages: list with the stages (dictionaries or sequences of key-value pairs, see the module's docstring).
+        :param run_config: the RunConfig of the run, used after the last stage and as the base of the stages' settings.
+        """
+        self._stages = [dict(s) for s in stages]
+        self._configs = []
+        for stage in self._stages:
+            for key in stage:
+                if key not in STAGE_KEYS and key != "ADVANCE_SCORE":
+                    raise ValueError("Invalid curriculum setting \"%s\"! Valid settings: %s." % (
+                        key, str(STAGE_KEYS + ("ADVANCE_SCORE",))))
+            self._configs.append(run_config.replace(**{k.lower(): v for k, v in stage.items() if k in STAGE_KEYS}))
+        self._configs.append(run_config)
+
+        self._stage = 0
+        self._history = [{"stage": 0, "generation": 0}]
+
+    @property
+    def stage(self):
+        """ Index of the current stage (len(stages) after the last one). """
+        return self._stage
+
+    @property
+    def num_stages(self):
+        """ Number of stages, including the final one (the run's own settings). """
+        return len(self._configs)
+
+    @property
+    def run_config(self):
+        """ The RunConfig of the current stage. """
+        return self._configs[self._stage]
+
+    def update(self, generation, score):
+        """ Advances to the next stage if the population's score reached the current stage's threshold.
+
+        :param generation: the generation that was just evaluated.
+        :param score: the population's score in that generation.
+        :return: True if the curriculum advanced to a new stage and False otherwise.
+        """
+        if self._stage >= len(self._stages):
+            return False
+
+        advance_score = self._stages[self._stage].get("ADVANCE_SCORE")
+        if advance_score is None or score < advance_score:
+            return False
+
+        self._stage += 1
+        self._history.append({"stage": self._stage, "generation": generation + 1, "score": float(score)})
+        return True
+
+    def save(self, pathname):
+        """ Writes the schedule (the stages and the generations in which they were reached) to a JSON file. The file is a
+        log of the run: it's rewritten whenever the curriculum advances, but isn't read back. """
+        with open(pathname, "w") as file:
+            json.dump({"stages": self._stages, "stage": self._stage, "history": self._history}, file, indent=4)
@@ -3,17 +3,16 @@
 @author Gabriel Nogueira (Talendar)
 """
 
-from game_logic_handler import *
-from snake_game import SnakeGame
-from evolution.snake_ai import SnakeAI
-from neural_network.neural_network import NeuralNetwork
+from game_logic_handler import GameLogicHandler
+from evolution.snake_ai import SnakeAI, read_population_info
+from neural_network.model_store import ModelStore
 
 
 class EvolutionVisualizer:
     """ Simulates a game with an AI player of a population. """
 
     def __init__(self, pop_dir, use_food_list=True):
-        self._models_dir = pop_dir + "best_models/"
+        self._models = ModelStore(pop_dir + "best_models/")
         self._food_list = []
 
         if use_food_list:
@@ -23,13 +22,26 @@ class EvolutionVisualizer:
                     s = i.split(" ")
                     self._food_list.append(( int(s[0]), int(s[1]) ))
 
-        with open(pop_dir + "info.txt", "r") as file:
-            lines = file.readlines()
-            size = tuple([int(i) for i in lines[2].split() if i.isdigit()])
-            config.BOARD_SIZE = size
-            self.best_gen = int(lines[9].split()[1])
+        self._run_config, info = read_population_info(pop_dir)
+        self.best_gen = int(info["BEST_SCORE_EVER_GEN"][0])
 
     def start(self, gen):
-        snake = SnakeAI(brain=NeuralNetwork.load(self._models_dir + "gen_%d" % gen))
-        game = SnakeGame(snake, handler=GameLogicHandler(food_list=self._food_list))
-        game.start(gen=gen+1, bonus_points=True)
\ No newline at end of file
+        from snake_game import SnakeGame  # GUI stack is only loaded when something is actually displayed
+        snake = SnakeAI(brain=self._models.get(gen), run_config=self._run_config)
+        game = SnakeGame(snake, handler=GameLogicHandler(food_list=self._food_list, run_config=self._run_config))
+        game.start(gen=gen+1, bonus_points=True)
+
+    def start_mosaic(self, gens, games_per_model=16, seed=0, cell_size=4):
+        """ Displays, at once, games played by the models of the given generations (see evolution/mosaic_viewer.py).
+
+        :param gens: the generations whose models play.
+        :param games_per_model: number of games (with different seeds) played by each model.
+        :param seed: seed of the first game of each model.
+        :param cell_size: size (in pixels) of each cell of the boards.
+        """
+        from evolution.mosaic_viewer import MosaicViewer  # GUI stack is only loaded when something is actually displayed
+        brains = {gen: self._models.get(gen) for gen in gens}
+        viewer = MosaicViewer([brains[gen] for gen in gens for _ in range(games_per_model)],
+                              [seed + s for _ in gens for s in range(games_per_model)],
+                              self._run_config, cell_size=cell_size)
+        viewer.show()
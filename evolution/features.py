@@ -0,0 +1,148 @@
+""" Feature encoders: the ways the state of a game is turned into the input of an AI's neural network.
+
+Every encoder includes three features describing where the food is. Besides them:
+
+    * "window": the raw codes of the cells in a square window around the snake's head (the original encoding). Its
+      size grows quadratically with SIGHT_RADIUS and nothing beyond the window can be seen;
+    * "raycast": the inverse of the distance to the nearest wall, body part and food along each of the 8 directions
+      (0 if there is none), so the snake can see the whole board with only 27 features;
+    * "egocentric": the window around the snake's head rotated so the snake always faces up, plus the direction the
+      snake is heading to (which is needed to choose an absolute action).
+
+The encoder is selected by the FEATURE_ENCODER setting and defines the size of the networks' input layer.
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+from abc import ABC, abstractmethod
+import numpy as np
+import config
+
+
+# the 8 directions of the raycast encoder (row and column steps), clockwise, starting from "up"
+DIRECTIONS = np.array([(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)])
+
+# entities detected by the raycast encoder, in the order their features appear
+RAY_ENTITIES = (config.WALL, config.SNAKE_BODY, config.FOOD)
+
+
+class FeatureEncoder(ABC):
+    """ Turns the state of a game into a vector of features. """
+
+    def __init__(self, run_config):
+        self._run_config = run_config
+        self.num_features = self.feature_count(run_config)
+
+    @staticmethod
+    @abstractmethod
+    def feature_count(run_config):
+        """ Returns the number of features produced by the encoder with the given settings. """
+        pass
+
+    @abstractmethod
+    def encode(self, game_handler):
+        """ Returns a numpy array with the features describing the current state of the given game. """
+        pass
+
+    @staticmethod
+    def _food_features(game_handler):
+        food_dist = game_handler.rel_food_dist()
+        return np.array([game_handler.angle_to_food(), food_dist[0], food_dist[1]])
+
+
+class WindowEncoder(FeatureEncoder):
+    """ Food features followed by the codes of the cells within SIGHT_RADIUS of the snake's head. """
+
+    @staticmethod
+    def feature_count(run_config):
+        return run_config.num_cells + 3
+
+    def encode(self, game_handler):
+        return np.concatenate([self._food_features(game_handler),
+                               game_handler.board_area(self._run_config.sight_radius).ravel()])
+
+
+class RaycastEncoder(FeatureEncoder):
+    """ Food features followed by, for each of the 8 directions, the inverse of the distance to the nearest wall, body
+    part and food.
+
+    The offsets of the cells along every ray are computed once. On each call, all the rays are traced at once in the
+    game's occupancy grid (see GameLogicHandler.grid).
+    """
+
+    def __init__(self, run_config):
+        super().__init__(run_config)
+        self._shape = run_config.board_size[1], run_config.board_size[0]
+        steps = np.arange(1, max(self._shape))
+        self._offsets = DIRECTIONS[:, None, :] * steps[None, :, None]  # shape: [directions, steps, 2]
+        self._inv_dist = 1 / steps
+
+    @staticmethod
+    def feature_count(run_config):
+        return 3 + len(DIRECTIONS) * len(RAY_ENTITIES)
+
+    def encode(self, game_handler):
+        pos = self._offsets + game_handler.head_pos
+        rows, cols = pos[..., 0], pos[..., 1]
+        inside = (rows >= 0) & (rows < self._shape[0]) & (cols >= 0) & (cols < self._shape[1])
+        cells = np.where(inside, game_handler.grid[rows.clip(0, self._shape[0] - 1), cols.clip(0, self._shape[1] - 1)],
+                         config.WALL)
+
+        rays = []
+        for entity in RAY_ENTITIES:
+            hit = cells == entity
+            rays.append(np.where(hit.any(axis=1), self._inv_dist[hit.argmax(axis=1)], 0))
+
+        return np.concatenate([self._food_features(game_handler)] + rays)
+
+
+class EgocentricEncoder(FeatureEncoder):
+    """ Food distance and window around the snake's head, both rotated so the snake faces up, followed by the one-hot
+    encoded direction the snake is heading to (up, right, down or left). """
+
+    @staticmethod
+    def feature_count(run_config):
+        return run_config.num_cells + 2 + 4
+
+    def encode(self, game_handler):
+        snake_pos = game_handler.snake_pos
+        turns = 0  # number of counterclockwise quarter turns that make the snake face up
+        if len(snake_pos) > 1:
+            di, dj = snake_pos[0][0] - snake_pos[1][0], snake_pos[0][1] - snake_pos[1][1]
+            turns = {(-1, 0): 0, (0, 1): 1, (1, 0): 2, (0, -1): 3}.get((di, dj), 0)
+
+        food_i, food_j = game_handler.rel_food_dist()
+        for _ in range(turns):
+            food_i, food_j = -food_j, food_i
+
+        heading = np.zeros(4)
+        heading[turns] = 1
+        window = np.rot90(game_handler.board_area(self._run_config.sight_radius), turns)
+        return np.concatenate([[food_i, food_j], heading, window.ravel()])
+
+
+# Maps the name of each encoder to its implementation.
+ENCODERS = {
+    "window": WindowEncoder,
+    "raycast": RaycastEncoder,
+    "egocentric": EgocentricEncoder,
+}
+
+
+def encoder_class(name):
+    """ Returns the class of the feature encoder with the given name. """
+    if name not in ENCODERS:
+        raise ValueError("Feature encoder \"%s\" doesn't exist! Available encoders: %s." % (name, str(tuple(ENCODERS))))
+    return ENCODERS[name]
+
+
+# encoders reused by the games of a process (one per RunConfig)
+_encoder_cache = {}
+
+
+def encoder_for(run_config):
+    """ Returns the feature encoder selected by the given RunConfig, reused across calls. """
+    encoder = _encoder_cache.get(run_config)
+    if encoder is None:
+        encoder = _encoder_cache[run_config] = encoder_class(run_config.feature_encoder)(run_config)
+    return encoder
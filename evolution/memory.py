@@ -0,0 +1,106 @@
+""" Opt-in memory instrumentation of long evolution runs (enabled by the MEMORY_PROFILING setting).
+
+Once per generation, the main process and each worker process take a snapshot of their memory: the resident set size
+(RSS), the memory traced by tracemalloc (current and peak), the number of live SnakeAI, NeuralNetwork and numpy array
+objects and the code locations (allocation sites) whose allocated memory changed the most since the previous snapshot of
+the same process. The snapshots are appended to the file "memory.jsonl" in the population's output directory (see
+evolution/telemetry.py), so a leak can be found before it takes a multi-day run down.
+
+tracemalloc slows down every allocation (and walking the heap to count the objects isn't free either), so the
+instrumentation should only be enabled while investigating the memory usage of a run.
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+import gc
+import os
+import tracemalloc
+
+
+# types whose live objects are counted
+COUNTED_TYPES = ("SnakeAI", "NeuralNetwork", "ndarray")
+
+# number of frames of the traceback stored by tracemalloc for each allocation
+TRACEBACK_FRAMES = 1
+
+
+def rss_bytes():
+    """ Returns the resident set size of the current process, in bytes (its peak, where the current value isn't
+    available). """
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource  # not available on Windows
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def object_counts(type_names=COUNTED_TYPES):
+    """ Returns a dictionary with the number of live objects of each of the given types (by name).
+
+    Objects that aren't tracked by the garbage collector (like numpy arrays) are only counted if they are referenced by
+    tracked objects (e.g. the attributes of an instance or the local variables of a frame).
+    """
+    counts = dict.fromkeys(type_names, 0)
+    seen = set()
+    objects = gc.get_objects()
+    for obj in objects + gc.get_referents(*objects):
+        name = type(obj).__name__
+        if name in counts and id(obj) not in seen:
+            seen.add(id(obj))
+            counts[name] += 1
+    return counts
+
+
+class MemoryProfiler:
+    """ Takes snapshots of the memory usage of the current process (see the module's description). """
+
+    def __init__(self, top=10):
+        """ Constructor. Starts tracing the allocations of the process (with tracemalloc).
+
+        :param top: number of allocation sites reported in each snapshot.
+        """
+        self._top = top
+        self._previous = None
+        self._last_gen = None
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEBACK_FRAMES)
+
+    def snapshot(self, gen):
+        """ Takes a snapshot of the memory usage of the process.
+
+        :param gen: the current generation.
+        :return: a dictionary with the process' id, the generation, the RSS, the traced memory (current and peak), the
+        counts of live objects and the top allocation sites (sorted by how much their allocated memory changed since the
+        previous snapshot, or by its size in the first snapshot).
+        """
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        stats = snapshot.compare_to(self._previous, "lineno") if self._previous is not None \
+            else snapshot.statistics("lineno")
+        self._previous = snapshot
+        self._last_gen = gen
+
+        traced, traced_peak = tracemalloc.get_traced_memory()
+        return {
+            "pid": os.getpid(),
+            "generation": gen,
+            "rss": rss_bytes(),
+            "traced": traced,
+            "traced_peak": traced_peak,
+            "objects": object_counts(),
+            "top_sites": [{
+                "site": "%s:%d" % (s.traceback[0].filename, s.traceback[0].lineno),
+                "size": s.size,
+                "size_diff": getattr(s, "size_diff", s.size),
+                "count": s.count,
+            } for s in stats[:self._top]],
+        }
+
+    def sample(self, gen):
+        """ Takes a snapshot (see snapshot()) if none was taken during the given generation yet. Otherwise, returns
+        None. Called by the worker processes for each of their tasks. """
+        return self.snapshot(gen) if gen != self._last_gen else None
@@ -0,0 +1,217 @@
+""" Displays many games of AI players at once, in a grid (mosaic).
+
+All the games are stepped together: the features of the games played by the same network are fed to it in a single
+batch (see NeuralNetwork.predict_batch()). To draw a frame, the boards of all the games are written to a single matrix of
+cells, which is mapped to colors through a lookup table and copied to a small surface (one pixel per cell) with
+pygame.surfarray. The surface is then scaled to the window in a single blit, so dozens of games can be watched at
+interactive speed.
+
+Usage examples:
+    python -m evolution.mosaic_viewer ./evolution/populations/sample_pop/ --gen 20 --seeds 36
+    python -m evolution.mosaic_viewer ./evolution/populations/pop_1/ --top 16 --seeds 2
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+from evolution.snake_ai import SnakeAI, GameProgress, new_game, read_population_info
+from evolution.features import encoder_for
+from evolution.telemetry import read_metrics
+from neural_network.model_store import ModelStore
+import config
+
+import argparse
+import math
+import os
+import numpy as np
+
+
+# code of the cells between the boards (outside the range of the board entities)
+GAP = 100
+GAP_COLOR = (50, 50, 50)
+
+
+def color_lut():
+    """ Returns the lookup table that maps the code of a cell to its color (RGB). The codes of the cells of a game are
+    its board's entities (as unsigned bytes), plus 256 if the snake is dead. """
+    lut = np.zeros((512, 3), dtype=np.uint8)
+    lut[:] = config.BACKGROUND_COLOR
+    lut[GAP] = lut[256 + GAP] = GAP_COLOR
+    for entity, color in config.COLOR_MAP.items():
+        lut[entity & 0xFF] = lut[256 + (entity & 0xFF)] = color
+
+    lut[256 + (config.SNAKE_HEAD & 0xFF)] = config.DEAD_SNAKE_HEAD_COLOR
+    lut[256 + (config.SNAKE_BODY & 0xFF)] = config.DEAD_SNAKE_BODY_COLOR
+    return lut
+
+
+class MosaicViewer:
+    """ Plays and displays a grid of games of AI players. """
+
+    def __init__(self, brains, seeds, run_config, cols=None, cell_size=4):
+        """ Constructor.
+
+        :param brains: list with the neural network of each game. Games played by the same network (the same object)
+        share its batches.
+        :param seeds: list with the seed of each game (see evolution.snake_ai.new_game()).
+        :param run_config: the RunConfig with the settings of the games.
+        :param cols: number of games in each row of the mosaic. Defaults to a square grid.
+        :param cell_size: size (in pixels) of each cell of the boards.
+        """
+        self._run_config = run_config
+        self._encoder = encoder_for(run_config)
+        self._handlers = [new_game(run_config, seed=seed) for seed in seeds]
+        self._snakes = [SnakeAI(brain, run_config=run_config) for brain in brains]
+
+        self._progress = [GameProgress(h, run_config) for h in self._handlers]  # scoring and ending of each game
+
+        n = len(self._handlers)
+        self._dead = np.zeros(n, dtype=bool)
+        self._over = np.zeros(n, dtype=bool)
+
+        # games grouped by network, with the matrix of features of each group (kept for the games that are over, so the
+        # rows of the batches don't change)
+        groups = {}
+        for i, brain in enumerate(brains):
+            groups.setdefault(id(brain), (brain, []))[1].append(i)
+        self._groups = [(brain, indices, np.stack([self._encoder.encode(self._handlers[i]) for i in indices]))
+                        for brain, indices in groups.values()]
+
+        # mosaic: matrix of cell codes, with one tile (board plus a gap) per game
+        self._cols = cols if cols is not None else math.ceil(math.sqrt(n))
+        self._rows = math.ceil(n / self._cols)
+        h, w = self._handlers[0].grid.shape
+        self._boards = np.full((self._rows * self._cols, h, w), np.uint8(config.EMPTY), dtype=np.uint8)
+        self._codes = np.full((self._rows, h + 1, self._cols, w + 1), GAP, dtype=np.intp)
+        self._lut = color_lut()
+        self._cell_size = cell_size
+
+    @property
+    def num_games(self):
+        return len(self._handlers)
+
+    @property
+    def over(self):
+        """ Returns whether all the games are over. """
+        return bool(self._over.all())
+
+    @property
+    def scores(self):
+        """ Returns a list with the current score of each game. """
+        return [snake.score for snake in self._snakes]
+
+    @property
+    def image_size(self):
+        """ Returns the size (width, height), in pixels, of the mosaic. """
+        return self._codes.shape[3] * self._cols * self._cell_size, self._codes.shape[1] * self._rows * self._cell_size
+
+    def step(self):
+        """ Plays a turn of each game that isn't over. """
+        for brain, indices, features in self._groups:
+            for k, i in enumerate(indices):
+                if not self._over[i]:
+                    features[k] = self._encoder.encode(self._handlers[i])
+
+            outputs = brain.predict_batch(features)
+            for k, i in enumerate(indices):
+                if self._over[i]:
+                    continue
+
+                handler, snake, progress = self._handlers[i], self._snakes[i], self._progress[i]
+                action = snake.choose_action(handler, outputs[k])  # might add the life saving penalty to the score
+                snake.score += progress.score_turn(handler.update(action))
+                self._dead[i] = progress.dead
+                self._over[i] = progress.over
+
+    def rasterize(self):
+        """ Returns the mosaic as an RGB image (array with shape [width, height, 3], as used by pygame.surfarray), with
+        one pixel per cell. """
+        n = self.num_games
+        for i, handler in enumerate(self._handlers):
+            self._boards[i] = handler.grid.view(np.uint8)
+
+        codes = self._boards.astype(np.intp)
+        codes[:n] += 256 * self._dead[:, np.newaxis, np.newaxis]
+        h, w = codes.shape[1:]
+        self._codes[:, :h, :, :w] = codes.reshape(self._rows, self._cols, h, w).transpose(0, 2, 1, 3)
+
+        rows, cols = self._rows * (h + 1), self._cols * (w + 1)
+        return self._lut[self._codes.reshape(rows, cols)].transpose(1, 0, 2)
+
+    def show(self, fps=None):
+        """ Plays the games, drawing a frame after each turn, until all of them are over and the user presses a key (or
+        until the window is closed). """
+        import pygame
+        from game_screen import get_display
+
+        fps = fps if fps is not None else config.FPS
+        display = get_display(self.image_size)
+        image = self.rasterize()
+        cells = pygame.Surface(image.shape[:2])
+
+        step_ms = 1000 / fps
+        next_step = pygame.time.get_ticks()
+        while True:
+            # events
+            timeout = max(1, int(next_step - pygame.time.get_ticks())) if not self.over else 0
+            event = pygame.event.wait(timeout) if timeout > 0 else pygame.event.wait()
+            for e in [event] + pygame.event.get():
+                if e.type == pygame.QUIT or (e.type == pygame.KEYDOWN and (self.over or e.key == pygame.K_ESCAPE)):
+                    return
+
+            if self.over or pygame.time.get_ticks() < next_step:
+                continue
+            next_step = max(next_step + step_ms, pygame.time.get_ticks())
+
+            # turn and frame
+            self.step()
+            pygame.surfarray.blit_array(cells, self.rasterize())
+            pygame.transform.scale(cells, display.get_size(), display)
+            pygame.display.flip()
+            pygame.display.set_caption("Turn %d | %d/%d games running | best score: %d%s" % (
+                max(p.turn for p in self._progress), np.count_nonzero(~self._over), self.num_games, max(self.scores),
+                " | press any key to exit" if self.over else ""))
+
+
+def top_generations(pop_dir, k):
+    """ Returns the k generations of a population whose best individuals obtained the highest scores (according to the
+    population's metrics.jsonl). """
+    records = read_metrics(os.path.join(pop_dir, "metrics.jsonl"))
+    records.sort(key=lambda r: (-r["max"], r["generation"]))
+    return [r["generation"] for r in records[:k]]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Displays many games of a population's saved models at once.")
+    parser.add_argument("pop_dir", help="the population's output directory")
+    parser.add_argument("--gen", type=int, nargs="+", default=None,
+                        help="generations whose models play (default: the one with the best score ever)")
+    parser.add_argument("--top", type=int, default=None,
+                        help="instead of --gen, the number of generations with the highest scores whose models play")
+    parser.add_argument("--seeds", type=int, default=16, help="number of games (seeds) played by each model")
+    parser.add_argument("--seed", type=int, default=0, help="first seed of the games")
+    parser.add_argument("--cols", type=int, default=None, help="number of games in each row of the mosaic")
+    parser.add_argument("--cell-size", type=int, default=4, help="size (in pixels) of each cell of the boards")
+    parser.add_argument("--fps", type=int, default=None, help="turns per second (default: config.FPS)")
+    args = parser.parse_args(argv)
+
+    run_config, info = read_population_info(args.pop_dir)
+    gens = top_generations(args.pop_dir, args.top) if args.top is not None \
+        else args.gen if args.gen is not None else [int(info["BEST_SCORE_EVER_GEN"][0])]
+
+    models = ModelStore(os.path.join(args.pop_dir, "best_models"))
+    brains = {gen: models.get(gen) for gen in gens}
+    games = [(brains[gen], args.seed + s) for gen in gens for s in range(args.seeds)]
+    viewer = MosaicViewer([brain for brain, _ in games], [seed for _, seed in games], run_config, cols=args.cols,
+                          cell_size=args.cell_size)
+
+    import pygame
+    pygame.init()
+    viewer.show(fps=args.fps)
+    pygame.quit()
+    for gen in gens:
+        scores = viewer.scores[gens.index(gen) * args.seeds:(gens.index(gen) + 1) * args.seeds]
+        print("Generation %d: mean score %.2f (min: %d, max: %d)" % (gen, np.mean(scores), min(scores), max(scores)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+""" Novelty search: behaviour descriptors, an archive of past behaviours and a k-d tree for nearest-neighbour queries.
+
+The novelty of an individual is the mean distance between its behaviour descriptor and the k nearest descriptors among
+the archive and the current population. When enabled (NOVELTY_WEIGHT > 0), the genetic algorithm selects parents by a
+blend of the ranks of the individuals' scores and novelty, which rewards exploring new behaviours instead of only
+restarting from scratch (mass extinction) when the population stagnates.
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+import heapq
+import numpy as np
+
+
+# reasons why an episode ended, one-hot encoded in the behaviour descriptors
+END_CAUSES = ("wall", "body", "starvation", "turn_limit", "budget")
+
+
+def descriptor_size(grid):
+    """ Returns the number of dimensions of a behaviour descriptor whose visited-cells histogram has grid x grid bins. """
+    return grid*grid + 1 + len(END_CAUSES)
+
+
+class BehaviourRecorder:
+    """ Records the behaviour of a snake during an episode and summarizes it in a compact descriptor.
+
+    The descriptor contains a histogram of the positions visited by the snake's head (the board is divided in grid x grid
+    regions), the logarithm of the number of food items eaten and the one-hot encoded cause of the episode's end.
+    """
+
+    def __init__(self, board_size, grid):
+        self._grid = grid
+        self._visits = np.zeros(grid*grid)
+        self._bin_height = board_size[1] / grid
+        self._bin_width = board_size[0] / grid
+
+    def visit(self, pos):
+        """ Records a visit of the snake's head to the given position. """
+        self._visits[int(pos[0] / self._bin_height) * self._grid + int(pos[1] / self._bin_width)] += 1
+
+    def descriptor(self, food_count, end_cause):
+        """ Returns the descriptor of the recorded behaviour.
+
+        :param food_count: number of food items eaten during the episode.
+        :param end_cause: reason why the episode ended (one of END_CAUSES).
+        :return: the behaviour descriptor (numpy array).
+        """
+        cause = np.zeros(len(END_CAUSES))
+        cause[END_CAUSES.index(end_cause)] = 1
+        return np.concatenate([self._visits / max(1, self._visits.sum()), [np.log1p(food_count)], cause])
+
+
+class KDTree:
+    """ Static k-d tree over a set of points, for k-nearest-neighbour queries.
+
+    The tree is stored in flat arrays. Each node covers a contiguous range of a permutation of the points and keeps its
+    bounding box, used to prune the search. Nodes are split at the median of their widest dimension until they hold at
+    most "leaf_size" points. The distances to the points of a leaf are computed at once, with numpy.
+    """
+
+    def __init__(self, points, leaf_size=16):
+        self._points = np.asarray(points, dtype=np.float64)
+        self._perm = np.arange(len(self._points))
+        self._start, self._end, self._left, self._right, self._lo, self._hi = [], [], [], [], [], []
+
+        if len(self._points) > 0:
+            self._build(leaf_size)
+
+    def __len__(self):
+        return len(self._points)
+
+    def _new_node(self, start, end):
+        pts = self._points[self._perm[start:end]]
+        self._start.append(start)
+        self._end.append(end)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._lo.append(pts.min(axis=0))
+        self._hi.append(pts.max(axis=0))
+        return len(self._start) - 1
+
+    def _build(self, leaf_size):
+        stack = [self._new_node(0, len(self._points))]
+        while len(stack) > 0:
+            node = stack.pop()
+            start, end = self._start[node], self._end[node]
+            if end - start <= leaf_size:
+                continue
+
+            dim = int(np.argmax(self._hi[node] - self._lo[node]))
+            idx = self._perm[start:end]
+            mid = (end - start) // 2
+            self._perm[start:end] = idx[np.argpartition(self._points[idx, dim], mid)]
+
+            self._left[node] = self._new_node(start, start + mid)
+            self._right[node] = self._new_node(start + mid, end)
+            stack.extend([self._left[node], self._right[node]])
+
+        self._lo, self._hi = np.array(self._lo), np.array(self._hi)
+
+    def _box_dist2(self, node, x):
+        d = np.maximum(self._lo[node] - x, 0) + np.maximum(x - self._hi[node], 0)
+        return float(np.dot(d, d))
+
+    def query(self, x, k):
+        """ Finds the k points of the tree nearest to x.
+
+        :param x: the query point.
+        :param k: number of neighbours (if the tree has less than k points, all of them are returned).
+        :return: a tuple with the distances to the neighbours (ascending) and their indices in the original points.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        k = min(k, len(self._points))
+        if k == 0:
+            return np.zeros(0), np.zeros(0, dtype=np.int64)
+
+        best_d2, best_idx = np.full(k, np.inf), np.full(k, -1)
+        heap = [(0.0, 0)]
+        while len(heap) > 0:
+            d2, node = heapq.heappop(heap)
+            if d2 > best_d2.max():
+                break
+
+            if self._left[node] == -1:
+                idx = self._perm[self._start[node]:self._end[node]]
+                diff = self._points[idx] - x
+                cand_d2 = np.einsum("ij,ij->i", diff, diff)
+
+                all_d2 = np.concatenate([best_d2, cand_d2])
+                all_idx = np.concatenate([best_idx, idx])
+                keep = np.argpartition(all_d2, k - 1)[:k]
+                best_d2, best_idx = all_d2[keep], all_idx[keep]
+            else:
+                for child in (self._left[node], self._right[node]):
+                    heapq.heappush(heap, (self._box_dist2(child, x), child))
+
+        order = np.argsort(best_d2)
+        return np.sqrt(best_d2[order]), best_idx[order]
+
+
+class NoveltyArchive:
+    """ Archive of behaviour descriptors of past individuals, used to compute the novelty of new ones. """
+
+    def __init__(self, dims, k=10, max_size=5000, add_prob=0.05, rng=None):
+        """ Constructor.
+
+        :param dims: number of dimensions of the behaviour descriptors.
+        :param k: number of nearest neighbours considered when computing the novelty of a descriptor.
+        :param max_size: maximum number of descriptors in the archive (the oldest ones are discarded first).
+        :param add_prob: probability of each evaluated descriptor being added to the archive.
+        :param rng: the numpy Generator used to choose the descriptors added to the archive. If None, a new one is
+        created.
+        """
+        self._descriptors = np.zeros((0, dims))
+        self._k = k
+        self._max_size = max_size
+        self._add_prob = add_prob
+        self._rng = rng if rng is not None else np.random.default_rng()
+
+    def __len__(self):
+        return len(self._descriptors)
+
+    def novelty(self, descriptors):
+        """ Computes the novelty of each of the given descriptors (the ones of the current population).
+
+        :param descriptors: matrix with one behaviour descriptor per row.
+        :return: vector with the mean distance between each descriptor and its k nearest neighbours among the archive and
+        the other given descriptors.
+        """
+        descriptors = np.asarray(descriptors, dtype=np.float64)
+        tree = KDTree(np.concatenate([self._descriptors, descriptors]))
+        offset = len(self._descriptors)
+
+        novelty = np.zeros(len(descriptors))
+        for i, d in enumerate(descriptors):
+            dist, idx = tree.query(d, self._k + 1)
+            dist = dist[idx != offset + i][:self._k]  # ignoring the descriptor itself
+            novelty[i] = dist.mean() if len(dist) > 0 else 0
+        return novelty
+
+    def add(self, descriptors):
+        """ Adds each of the given descriptors to the archive with probability "add_prob". """
+        chosen = np.asarray(descriptors)[self._rng.random(len(descriptors)) < self._add_prob]
+        self._descriptors = np.concatenate([self._descriptors, chosen])[-self._max_size:]
+
+
+def rank_normalize(values):
+    """ Maps the given values to their ranks, scaled to the interval [0, 1]. """
+    ranks = np.empty(len(values))
+    ranks[np.argsort(values, kind="stable")] = np.arange(len(values))
+    return ranks / max(1, len(values) - 1)
+
+
+def blend(scores, novelty, weight):
+    """ Blends the scores and the novelty of the individuals of a population by the (normalized) ranks of each.
+
+    :param scores: vector with the individuals' scores.
+    :param novelty: vector with the individuals' novelty.
+    :param weight: weight of the novelty, between 0 (only the scores matter) and 1 (only the novelty matters).
+    :return: vector with the values to be used in selection.
+    """
+    return (1 - weight) * rank_normalize(scores) + weight * rank_normalize(novelty)
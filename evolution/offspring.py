@@ -0,0 +1,188 @@
+""" Generation of the population's genomes by the worker processes.
+
+Instead of building the children of a generation and sending their genomes to the workers, the main process only
+decides, for each individual, how its genome is derived from the genomes of the previous generation. That is its lineage
+record: the index of its parent, the index of the parent's mate (crossover), the seed of the random numbers of its
+mutation and the mutation rate. The genomes of the parents are kept in a buffer in shared memory, so each worker builds
+the genomes of the individuals it evaluates by itself, and only the scores come back.
+
+A lineage record with no parent describes a new random genome. A record with a mutation rate of 0 and no mate describes
+an exact copy of its parent, which is how explicitly given genomes (e.g. the candidates of an optimizer) are
+represented: they are written to the buffer and each individual is the copy of its own row.
+
+The main process only rebuilds the genomes of the few individuals that become parents (or that are saved), so the
+serial reproduction phase between generations doesn't grow with the size of the genomes of the whole population.
+
+The genomes of "int8" brains are kept quantized in the buffer: 8-bit integers with one scale per segment of the genome
+(the weights and the bias of each layer, see NeuralNetwork.genome_segments()). The genomes built from them are
+quantized and dequantized again, so an individual is evaluated with exactly the genome it's stored with.
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+from neural_network.neural_network import quantize
+import config
+
+from multiprocessing import shared_memory
+import numpy as np
+
+
+# one record per individual; parent and mate are indices of individuals of the previous generation (-1: none)
+LINEAGE_DTYPE = np.dtype([("parent", np.int64), ("mate", np.int64), ("seed", np.uint64), ("rate", np.float64)])
+
+# genomes of the parents in a worker process (see attach_parents()), the sizes of their segments (if they're quantized)
+# and the last genome built by the worker
+_worker_parents = None
+_worker_segments = None
+_worker_memory = None
+_worker_cache = None, None
+
+
+def copies(n):
+    """ Returns the lineage records of n individuals that are exact copies of the first n rows of the buffer. """
+    lineage = np.zeros(n, dtype=LINEAGE_DTYPE)
+    lineage["parent"] = np.arange(n)
+    lineage["mate"] = -1
+    return lineage
+
+
+def random_lineage(seeds):
+    """ Returns the lineage records of new random genomes, one for each of the given seeds. """
+    lineage = np.zeros(len(seeds), dtype=LINEAGE_DTYPE)
+    lineage["parent"] = lineage["mate"] = -1
+    lineage["seed"] = seeds
+    return lineage
+
+
+def quantized_dtype(genome_size, num_segments):
+    """ Returns the dtype of a quantized genome: its genes ("q", int8) and the scale of each of its segments. """
+    return np.dtype([("q", np.int8, (genome_size,)), ("scale", np.float64, (num_segments,))])
+
+
+def quantize_genomes(genomes, segments):
+    """ Quantizes a matrix of genomes (one per row), with one scale per segment of each genome.
+
+    :param genomes: matrix with the genomes.
+    :param segments: list with the sizes of the consecutive segments of the genomes.
+    :return: a vector with the quantized genomes (see quantized_dtype()).
+    """
+    genomes = np.asarray(genomes, dtype=np.float64)
+    quantized = np.zeros(len(genomes), dtype=quantized_dtype(genomes.shape[1], len(segments)))
+    bounds = np.cumsum([0] + list(segments))
+    for k, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        if end > start:
+            quantized["q"][:, start:end], scale = quantize(genomes[:, start:end], axis=1)
+            quantized["scale"][:, k] = scale[:, 0]
+    return quantized
+
+
+def dequantize_genomes(quantized, segments):
+    """ Returns a matrix (float64) with the genomes approximated by the given quantized genomes. """
+    return quantized["q"] * np.repeat(quantized["scale"], segments, axis=1)
+
+
+def genome_buffer(n, genome_size, dtype, segments=None):
+    """ Returns a buffer for n genomes (zeroed): a matrix with the given dtype or, if the sizes of the segments of the
+    genomes are given, a vector of quantized genomes (see quantize_genomes()). """
+    if segments is None:
+        return np.zeros((n, genome_size), dtype=dtype)
+    return np.zeros(n, dtype=quantized_dtype(genome_size, len(segments)))
+
+
+def store_genomes(buffer, indices, genomes, segments=None):
+    """ Writes a matrix of genomes (one per row) to the given rows of a buffer (see genome_buffer()). """
+    buffer[indices] = genomes if segments is None else quantize_genomes(genomes, segments)
+
+
+def mutate_genomes(genomes, rate, weights_mult_factor=config.WEIGHTS_MULT_FACTOR, rng=None):
+    """ Mutates, in place, a matrix of genomes (one per row) using the "replace" method.
+
+    Each gene is replaced, with probability equal to the mutation rate, by a new random value. The random values for the
+    whole matrix are drawn at once.
+
+    :param genomes: matrix with one genome per row.
+    :param rate: the mutation rate.
+    :param weights_mult_factor: factor that multiplies the new random values.
+    :param rng: the numpy Generator used to draw the random values. If None, numpy's global generator is used.
+    :return: the given matrix of genomes.
+    """
+    rng = rng if rng is not None else np.random
+    mask = rng.random(genomes.shape) < rate
+    genomes[mask] = rng.uniform(low=-1, high=1, size=np.count_nonzero(mask)) * weights_mult_factor
+    return genomes
+
+
+def _parent_genome(parents, index, segments):
+    return parents[index] if segments is None else dequantize_genomes(parents[index:index + 1], segments)[0]
+
+
+def make_offspring(parents, record, weights_mult_factor, segments=None):
+    """ Builds the genome described by a lineage record.
+
+    :param parents: buffer with the genomes of the parents (see genome_buffer()).
+    :param record: the lineage record (a tuple containing the parent, the mate, the seed and the mutation rate).
+    :param weights_mult_factor: factor that multiplies the new random values.
+    :param segments: the sizes of the segments of the genomes, if the parents' genomes are quantized.
+    :return: the new genome, with the dtype of the parents' genomes (float64, if they're quantized).
+    """
+    parent, mate, seed, rate = record
+    rng = np.random.default_rng(int(seed))
+    dtype = parents.dtype if segments is None else np.dtype(np.float64)
+    if parent < 0:
+        genome_size = parents.shape[1] if segments is None else sum(segments)
+        genome = (rng.uniform(low=-1, high=1, size=genome_size) * weights_mult_factor).astype(dtype)
+    else:
+        genome = _parent_genome(parents, parent, segments).copy() if mate < 0 else \
+            ((_parent_genome(parents, parent, segments) + _parent_genome(parents, mate, segments)) / 2).astype(dtype)
+        if rate > 0:
+            mutate_genomes(genome[np.newaxis], rate, weights_mult_factor, rng=rng)
+
+    if segments is not None:
+        genome = dequantize_genomes(quantize_genomes(genome[np.newaxis], segments), segments)[0]
+    return genome
+
+
+class SharedGenomes:
+    """ Matrix of genomes in shared memory, readable by the worker processes (see attach_parents()). """
+
+    def __init__(self, genomes, segments=None):
+        """ Constructor.
+
+        :param genomes: buffer with the initial genomes (see genome_buffer()).
+        :param segments: the sizes of the segments of the genomes, if they're quantized.
+        """
+        self._memory = shared_memory.SharedMemory(create=True, size=max(1, genomes.nbytes))
+        self._segments = segments
+        self.array = np.ndarray(genomes.shape, dtype=genomes.dtype, buffer=self._memory.buf)
+        self.array[:] = genomes
+
+    @property
+    def spec(self):
+        """ Returns the arguments of attach_parents() for this buffer. """
+        return self._memory.name, self.array.shape, self.array.dtype, self._segments
+
+    def close(self):
+        """ Releases the buffer. Views of it (other than the "array" attribute) must be deleted first. """
+        self.array = None
+        self._memory.close()
+        self._memory.unlink()
+
+
+def attach_parents(name, shape, dtype, segments=None):
+    """ Maps the buffer of the parents' genomes in a worker process. Used as the initializer of the pool of workers. """
+    global _worker_parents, _worker_segments, _worker_memory
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    _worker_parents = np.ndarray(shape, dtype=np.dtype(dtype), buffer=_worker_memory.buf)
+    _worker_segments = segments
+
+
+def worker_genome(key, record, weights_mult_factor):
+    """ Builds, in a worker process, the genome described by a lineage record (see make_offspring()).
+
+    The games of an individual are usually simulated one after the other by the same worker, so the last genome built is
+    cached under the given key, which must be unique within a run (e.g. the generation and the individual's index).
+    """
+    global _worker_cache
+    if _worker_cache[0] != key:
+        _worker_cache = key, make_offspring(_worker_parents, record, weights_mult_factor, _worker_segments)
+    return _worker_cache[1]
@@ -0,0 +1,190 @@
+""" Gradient-free optimizers that work on flat genomes (see NeuralNetwork.get_genome()).
+
+The optimizers follow an ask-and-tell interface: ask() returns a matrix of candidate genomes (one per row), which the
+population evaluates with its usual fitness function and pool of workers, and tell() receives the scores obtained by the
+candidates (higher is better).
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+from abc import ABC, abstractmethod
+import numpy as np
+
+
+class Optimizer(ABC):
+    """ Interface of an ask-and-tell optimizer. """
+
+    @abstractmethod
+    def ask(self):
+        """ Returns a matrix with the candidate genomes (one per row) to be evaluated. """
+        pass
+
+    @abstractmethod
+    def tell(self, scores):
+        """ Updates the optimizer's state with the scores obtained by the candidates returned by the last call to ask().
+        """
+        pass
+
+    @property
+    @abstractmethod
+    def mean(self):
+        """ Returns the current estimate of the best genome (the center of the search distribution). """
+        pass
+
+    @property
+    @abstractmethod
+    def sigma(self):
+        """ Returns the current step size of the search. """
+        pass
+
+
+class CMAES(Optimizer):
+    """ Covariance Matrix Adaptation Evolution Strategy, the (mu/mu_w, lambda)-CMA-ES.
+
+    All the candidates of a generation are sampled and updated with matrix operations. The eigendecomposition of the
+    covariance matrix is only recomputed every few generations, as usual for large problems. With diagonal=True, the
+    separable variant (sep-CMA-ES) is used: only the variances are adapted, which makes each generation linear in the
+    number of genes and adapts faster, at the cost of ignoring correlations.
+    """
+
+    def __init__(self, x0, sigma0, popsize, diagonal=False, rng=None):
+        self._rng = rng if rng is not None else np.random.default_rng()
+        self._n = n = len(x0)
+        self._mean = np.array(x0, dtype=np.float64)
+        self._sigma = sigma0
+        self._lambda = popsize
+        self._diagonal = diagonal
+
+        self._mu = mu = popsize // 2
+        weights = np.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+        self._weights = weights / weights.sum()
+        self._mueff = mueff = 1 / np.sum(self._weights**2)
+
+        self._cc = (4 + mueff/n) / (n + 4 + 2*mueff/n)
+        self._cs = (mueff + 2) / (n + mueff + 5)
+        self._c1 = 2 / ((n + 1.3)**2 + mueff)
+        self._cmu = min(1 - self._c1, 2 * (mueff - 2 + 1/mueff) / ((n + 2)**2 + mueff))
+        if diagonal:
+            self._c1 = min(1, self._c1 * (n + 2) / 3)
+            self._cmu = min(1 - self._c1, self._cmu * (n + 2) / 3)
+        self._damps = 1 + 2*max(0, np.sqrt((mueff - 1) / (n + 1)) - 1) + self._cs
+        self._chi_n = np.sqrt(n) * (1 - 1/(4*n) + 1/(21*n**2))
+
+        self._pc, self._ps = np.zeros(n), np.zeros(n)
+        self._d = np.ones(n)  # standard deviations along the principal axes
+        self._c = np.ones(n) if diagonal else np.eye(n)
+        self._b = None if diagonal else np.eye(n)
+        self._generation = self._eigen_generation = 0
+        self._y = None
+
+    @property
+    def mean(self):
+        return self._mean
+
+    @property
+    def sigma(self):
+        return self._sigma
+
+    def ask(self):
+        z = self._rng.standard_normal((self._lambda, self._n))
+        self._y = z * self._d if self._diagonal else (z * self._d) @ self._b.T
+        return self._mean + self._sigma * self._y
+
+    def tell(self, scores):
+        n, cs, cc, c1, cmu = self._n, self._cs, self._cc, self._c1, self._cmu
+        selected = self._y[np.argsort(-np.asarray(scores), kind="stable")[:self._mu]]
+        y_w = self._weights @ selected
+        self._mean = self._mean + self._sigma * y_w
+        self._generation += 1
+
+        # evolution paths
+        inv_sqrt_c_y = y_w / self._d if self._diagonal else self._b @ ((self._b.T @ y_w) / self._d)
+        self._ps = (1 - cs)*self._ps + np.sqrt(cs * (2 - cs) * self._mueff) * inv_sqrt_c_y
+        ps_norm = np.linalg.norm(self._ps)
+        hsig = ps_norm / np.sqrt(1 - (1 - cs)**(2*self._generation)) / self._chi_n < 1.4 + 2/(n + 1)
+        self._pc = (1 - cc)*self._pc + hsig * np.sqrt(cc * (2 - cc) * self._mueff) * y_w
+
+        # covariance matrix
+        decay = 1 - c1 - cmu + (1 - hsig) * c1 * cc * (2 - cc)
+        if self._diagonal:
+            self._c = decay*self._c + c1*self._pc**2 + cmu * (self._weights @ selected**2)
+            self._d = np.sqrt(np.maximum(self._c, 1e-20))
+        else:
+            self._c = decay*self._c + c1*np.outer(self._pc, self._pc) + cmu * (selected.T * self._weights) @ selected
+            if self._generation - self._eigen_generation > 1 / (c1 + cmu) / n / 10:
+                self._eigen_generation = self._generation
+                self._c = np.triu(self._c) + np.triu(self._c, 1).T
+                d2, self._b = np.linalg.eigh(self._c)
+                self._d = np.sqrt(np.maximum(d2, 1e-20))
+
+        # step size
+        self._sigma *= np.exp((cs / self._damps) * (ps_norm / self._chi_n - 1))
+
+
+class OpenAIES(Optimizer):
+    """ Natural evolution strategy with antithetic sampling, as popularized by OpenAI (Salimans et al., 2017).
+
+    Candidates are sampled in mirrored pairs around the current mean (plus the mean itself, if the population size is
+    odd). The gradient is estimated from the centered ranks of the scores and applied with Adam.
+    """
+
+    def __init__(self, x0, sigma, popsize, learning_rate=0.01, weight_decay=0.005, beta1=0.9, beta2=0.999, rng=None):
+        self._rng = rng if rng is not None else np.random.default_rng()
+        self._theta = np.array(x0, dtype=np.float64)
+        self._sigma = sigma
+        self._popsize = popsize
+        self._learning_rate = learning_rate
+        self._weight_decay = weight_decay
+        self._beta1, self._beta2 = beta1, beta2
+        self._m, self._v = np.zeros(len(x0)), np.zeros(len(x0))
+        self._t = 0
+        self._eps = None
+
+    @property
+    def mean(self):
+        return self._theta
+
+    @property
+    def sigma(self):
+        return self._sigma
+
+    def ask(self):
+        half = self._rng.standard_normal((self._popsize // 2, len(self._theta)))
+        self._eps = np.concatenate([half, -half] + ([np.zeros((1, len(self._theta)))] if self._popsize % 2 else []))
+        return self._theta + self._sigma * self._eps
+
+    def tell(self, scores):
+        ranks = np.empty(len(scores))
+        ranks[np.argsort(scores, kind="stable")] = np.arange(len(scores))
+        ranks = ranks / max(1, len(scores) - 1) - 0.5  # centered ranks, in [-0.5, 0.5]
+
+        grad = ranks @ self._eps / (len(scores) * self._sigma) - self._weight_decay * self._theta
+
+        # Adam (gradient ascent)
+        self._t += 1
+        self._m = self._beta1*self._m + (1 - self._beta1)*grad
+        self._v = self._beta2*self._v + (1 - self._beta2)*grad**2
+        m_hat = self._m / (1 - self._beta1**self._t)
+        v_hat = self._v / (1 - self._beta2**self._t)
+        self._theta = self._theta + self._learning_rate * m_hat / (np.sqrt(v_hat) + 1e-8)
+
+
+def make_optimizer(name, x0, popsize, sigma, learning_rate=0.01, rng=None):
+    """ Creates an optimizer from its name.
+
+    :param name: "cmaes", "sep_cmaes" (diagonal CMA-ES) or "openai_es".
+    :param x0: the initial genome (center of the search distribution).
+    :param popsize: number of candidates per generation.
+    :param sigma: the initial step size.
+    :param learning_rate: learning rate (only used by "openai_es").
+    :param rng: the numpy Generator used to sample the candidates. If None, a new one is created.
+    :return: the new optimizer.
+    """
+    if name == "cmaes":
+        return CMAES(x0, sigma, popsize, rng=rng)
+    if name == "sep_cmaes":
+        return CMAES(x0, sigma, popsize, diagonal=True, rng=rng)
+    if name == "openai_es":
+        return OpenAIES(x0, sigma, popsize, learning_rate=learning_rate, rng=rng)
+
+    raise ValueError("Optimizer \"%s\" doesn't exist!" % name)
@@ -0,0 +1,56 @@
+""" Hierarchy of the random number generators of an evolution run.
+
+All the randomness of a run derives from a single seed (the SEED setting), through numpy's SeedSequence:
+
+    run
+     +-- streams: "init" (initial population), "optimizer" and "novelty" (long-lived generators)
+     +-- generation g: selection, mutation and predation of the generation
+          +-- individual i: the seeds of the games played by the individual in the generation
+
+The seed of a game only depends on the run's seed, the generation, the individual and the game's index, so the results of
+a run don't depend on how the games are distributed among worker processes (or on the number of workers).
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+import numpy as np
+
+
+# long-lived generators that aren't tied to a generation
+STREAMS = ("init", "optimizer", "novelty")
+
+# first element of the spawn keys of the streams and of the generations
+_STREAM_KEY, _GENERATION_KEY = 0, 1
+
+
+class SeedTree:
+    """ Derives the random number generators and the game seeds of a run from its seed. """
+
+    def __init__(self, seed=None):
+        """ Constructor.
+
+        :param seed: the run's seed. If None, a random seed is chosen (see the "entropy" property).
+        """
+        self._root = np.random.SeedSequence(seed)
+
+    @property
+    def entropy(self):
+        """ The run's seed. Passing it to a new SeedTree reproduces the run. """
+        return self._root.entropy
+
+    def _child(self, *key):
+        return np.random.SeedSequence(self._root.entropy, spawn_key=key)
+
+    def stream(self, name):
+        """ Returns a new generator for the given stream (one of STREAMS). """
+        return np.random.default_rng(self._child(_STREAM_KEY, STREAMS.index(name)))
+
+    def generation(self, gen):
+        """ Returns a new generator for the operations of the given generation. """
+        return np.random.default_rng(self._child(_GENERATION_KEY, gen))
+
+    def game_seeds(self, gen, num_individuals, plays):
+        """ Returns a matrix with the seeds (one row per individual, one column per game) of the games of the given
+        generation. """
+        return np.array([self._child(_GENERATION_KEY, gen, i).generate_state(plays) for i in range(num_individuals)],
+                        dtype=np.uint32).reshape(num_individuals, plays)
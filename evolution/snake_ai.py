@@ -3,32 +3,73 @@
 @author Gabriel Nogueira (Talendar)
 """
 
-from game_logic_handler import *
+from game_logic_handler import GameLogicHandler, Action
 from player import Player
-from neural_network.neural_network import NeuralNetwork
+from neural_network.neural_network import NeuralNetwork, action_divergence
+from neural_network.model_store import ModelStore
+from evolution.telemetry import MetricsLogger, score_stats
+from evolution.novelty import BehaviourRecorder, NoveltyArchive, descriptor_size, blend
+from evolution.optimizers import make_optimizer
+from evolution.features import encoder_for
+from evolution.curriculum import Curriculum
+from evolution.rng import SeedTree
+from evolution.offspring import SharedGenomes, attach_parents, worker_genome, make_offspring, copies, random_lineage, \
+    genome_buffer, store_genomes, mutate_genomes
+from evolution.budget import GenerationBudget, EpisodeBudget, PREEMPTION_REASONS
+from evolution.memory import MemoryProfiler
+from run_config import RunConfig
 import config
 
+from collections import Counter
+from functools import partial
 from pathlib import Path
+import os
 from datetime import datetime
 import numpy as np
-import random
 import multiprocessing
+import time
 
 
 class SnakeAI(Player):
     """ Implementation of the AI player, controlled by a neural network. """
 
-    def __init__(self, brain, life_saving=config.LIFE_SAVING):
+    def __init__(self, brain, life_saving=None, run_config=None):
+        """ Constructor.
+
+        :param brain: the neural network that controls the snake. Can be None if the snake only plays with act_async().
+        :param life_saving: whether the life saving feature is enabled. If None, the value in the run config is used.
+        :param run_config: the RunConfig with the AI's settings. If None, the values in config.py are used.
+        """
         self.brain = brain
-        self._life_saving = life_saving
+        if self.brain is not None:
+            self.brain.reset()  # a new game is starting
+        self._run_config = run_config if run_config is not None else RunConfig.from_config()
+        self._life_saving = life_saving if life_saving is not None else self._run_config.life_saving
+        self._encoder = encoder_for(self._run_config)
         self._life_saving_cooldown = 0
         self.score = 0
         self.last_action = Action.LEFT
 
     def act(self, handler, user_events=None):
-        features = mount_features(handler)
-        h = self.brain.predict(features)
+        return self.choose_action(handler, self.brain.predict(self._encoder.encode(handler)))
 
+    async def act_async(self, handler, predict):
+        """ Chooses the snake's next action with a brain served elsewhere (e.g. by an InferenceServer).
+
+        :param handler: the GameLogicHandler of the game.
+        :param predict: coroutine function that receives the features of the current state of the game and returns the
+        outputs of the brain.
+        :return: the chosen action.
+        """
+        return self.choose_action(handler, await predict(self._encoder.encode(handler)))
+
+    def choose_action(self, handler, outputs):
+        """ Chooses the snake's next action given the outputs of its brain (one per action).
+
+        The action with the highest output is chosen, unless it would kill the snake and the life saving feature is
+        enabled (in which case the next best action is tried).
+        """
+        h = np.ravel(outputs)
         h = sorted(zip(h, range(len(h))), key=lambda pair: pair[0], reverse=True)
         index = h[0][1]
 
@@ -37,12 +78,12 @@ class SnakeAI(Player):
             for p in h:
                 index = p[1]
                 i, j = handler.new_head_pos(list(Action)[index])
-                if handler.board[i][j] == config.EMPTY or handler.board[i][j] == config.FOOD:
+                if handler.cell(i, j) == config.EMPTY or handler.cell(i, j) == config.FOOD:
                     break
-                self._life_saving_cooldown = config.LIFE_SAVING_COOLDOWN
+                self._life_saving_cooldown = self._run_config.life_saving_cooldown
 
-            if self._life_saving_cooldown == config.LIFE_SAVING_COOLDOWN:
-                self.score += config.LIFE_SAVING_PENALTY
+            if self._life_saving_cooldown == self._run_config.life_saving_cooldown:
+                self.score += self._run_config.life_saving_penalty
 
         new_action = list(Action)[index]
         if new_action != Action.opposite(self.last_action):
@@ -58,19 +99,61 @@ class SnakeAI(Player):
 class SnakePopulation:
     """ Represents a population of AI players.
 
-    Implements the genetic algorithm used to optimize the population's individuals.
+    Implements the genetic algorithm used to optimize the population's individuals. The state of the population is held
+    in arrays: a matrix with the genomes of the parents of the current generation (the flattened parameters of neural
+    networks, see NeuralNetwork.get_genome()), a vector of lineage records describing how the genome of each individual
+    is derived from them (see evolution/offspring.py), a vector with the individuals' scores and a vector with their ages
+    (number of generations they survived). Selection, predation and extinction are batched index operations over those
+    arrays. The genomes of the individuals are built by the worker processes that evaluate them. The genomes of "int8"
+    brains are stored quantized, with one scale per layer's weights and bias (see evolution/offspring.py).
+
+    Optionally (when NOVELTY_WEIGHT > 0), parents are selected by a blend of the individuals' scores and the novelty of
+    their behaviour (see evolution/novelty.py).
+
+    Instead of the genetic algorithm, a gradient-free optimizer (CMA-ES or OpenAI's evolution strategy, selected by the
+    OPTIMIZER setting) can generate the genomes of each generation. The games are simulated in the same way in both cases.
+
+    With a curriculum (the CURRICULUM setting, see evolution/curriculum.py), the games start on easier settings, which
+    are replaced by harder ones as the population's score improves.
+
+    The time spent on each game and on each generation can be bounded by budgets (see evolution/budget.py).
+
+    All the random numbers of a run are derived from the SEED setting (see evolution/rng.py). Each game is played with a
+    seed of its own, so a run with a given seed is reproducible regardless of the number of worker processes.
     """
 
-    def __init__(self, size=None, in_dir=None, pre_trained_brain=None):
+    def __init__(self, size=None, in_dir=None, pre_trained_brain=None, out_dir=None, processes=None, run_config=None):
+        """ Constructor.
+
+        :param size: number of individuals in the population.
+        :param in_dir: directory from which a population should be loaded (not supported yet).
+        :param pre_trained_brain: optional neural network to be used by the first individual of the population.
+        :param out_dir: directory where the population's results will be saved. If None, a new timestamped directory is
+        created inside config.BASE_OUT_DIR.
+        :param processes: number of worker processes used to simulate the games. Defaults to the number of CPUs.
+        :param run_config: the RunConfig with the settings of the run. If None, the values in config.py are used.
+        """
         if size is None and in_dir is None:
             raise AssertionError("Missing size argument or in_dir argument!")
         elif size is not None and in_dir is not None:
             raise AssertionError("Invalid size argument! When in_dir isn't None, the size is retrieved from a file.")
 
-        self._snakes = []
-        self._pop_fitness_history = []
-        self._best_fitness_history = []
         self._mass_extinction_counter = 0
+        self._processes = processes if processes is not None else multiprocessing.cpu_count()
+        self._run_config = run_config if run_config is not None else RunConfig.from_config()
+        self._seeds = SeedTree(self._run_config.seed)
+        self._rng = self._seeds.stream("init")
+        self._brain = create_brain(run_config=self._run_config)  # used to save the individuals' genomes as networks
+        self._curriculum = Curriculum(self._run_config.curriculum, self._run_config) \
+            if len(self._run_config.curriculum) > 0 else None
+
+        self._novelty_archive = None
+        if self._run_config.novelty_weight > 0:
+            self._novelty_archive = NoveltyArchive(descriptor_size(self._run_config.novelty_grid),
+                                                   k=self._run_config.novelty_k,
+                                                   max_size=self._run_config.novelty_archive_size,
+                                                   add_prob=self._run_config.novelty_archive_prob,
+                                                   rng=self._seeds.stream("novelty"))
 
         # LOADING MODELS
         if in_dir is not None:
@@ -78,156 +161,362 @@ class SnakePopulation:
 
         # CREATING NEW MODELS
         else:
-            self._out_dir = config.BASE_OUT_DIR + "pop_" + f"{datetime.now():%y_%m_%d_%H_%M_%S}" + "/"
+            self._out_dir = out_dir if out_dir is not None else \
+                config.BASE_OUT_DIR + "pop_" + f"{datetime.now():%y_%m_%d_%H_%M_%S}" + "/"
+            if not self._out_dir.endswith("/"):
+                self._out_dir += "/"
             Path(self._out_dir + "best_models/").mkdir(parents=True)
             self._size = size
             self._new_population()
 
             if pre_trained_brain is not None:
-                self._snakes[0].brain = pre_trained_brain
+                brain = create_brain(pre_trained_brain.get_weights(), run_config=self._run_config)
+                brain.set_bias(pre_trained_brain.get_bias())
+                store_genomes(self._parents, [0], brain.get_genome()[np.newaxis], self._segments)
+                self._lineage[0] = copies(1)[0]
+
+        self._optimizer = None
+        if self._run_config.optimizer != "ga":
+            self._optimizer = make_optimizer(self._run_config.optimizer, self._genome(0).astype(np.float64),
+                                             popsize=self._size, sigma=self._run_config.optimizer_sigma,
+                                             learning_rate=self._run_config.es_learning_rate,
+                                             rng=self._seeds.stream("optimizer"))
 
     @property
     def size(self):
         """ Returns the size of the population. """
         return self._size
 
-    def _new_population(self):
-        """ Creates a new population. """
-        self._snakes = []
-        for i in range(self._size):
-            self._snakes.append(SnakeAI(create_brain()))
+    @property
+    def run_config(self):
+        """ Returns the RunConfig with the settings of the run. """
+        return self._run_config
 
-    @staticmethod
-    def _play_process(snake):
-        """ Simulates the playing of the game with the given AI. """
-        for _ in range(config.PLAYS_PER_GEN):
-            game_handler = GameLogicHandler(food_list=config.FOOD_POS_LIST if config.USE_FOOD_LIST else None)
-            turn = last_food_turn = 0
+    @property
+    def game_config(self):
+        """ Returns the RunConfig of the games currently played (the current stage's one, if a curriculum is used). """
+        return self._curriculum.run_config if self._curriculum is not None else self._run_config
 
-            last_state = None
-            last_food_dist = game_handler.abs_food_dist()
+    @property
+    def seed(self):
+        """ Returns the run's seed (the one chosen at random, if the SEED setting is None). """
+        return self._seeds.entropy
 
-            while last_state != GameLogicHandler.State.DEAD and \
-                    turn < config.MAX_TURNS and (turn - last_food_turn) < config.MAX_NO_FOOD_TURNS:
+    @property
+    def out_dir(self):
+        """ Returns the directory where the population's results are saved. """
+        return self._out_dir
 
-                move = snake.act(game_handler)
-                last_state = game_handler.update(move)
-                new_food_dist = game_handler.abs_food_dist()
+    @property
+    def genomes(self):
+        """ Returns a matrix with the population's genomes (one per row), built from their lineage records. """
+        return np.stack([self._genome(i) for i in range(len(self._lineage))])
 
-                if last_state == GameLogicHandler.State.FOOD_EATEN:
-                    snake.score += config.FOOD_SCORE
-                    last_food_turn = turn
-                else:
-                    snake.score += config.FARTHER_FROM_FOOD_SCORE if new_food_dist >= last_food_dist else config.CLOSER_TO_FOOD_SCORE
+    @property
+    def lineage(self):
+        """ Returns the vector with the individuals' lineage records (see evolution/offspring.py). """
+        return self._lineage
 
-                last_food_dist = new_food_dist
-                turn += 1
+    @property
+    def scores(self):
+        """ Returns the vector with the scores obtained by the individuals in the last evaluation. """
+        return self._scores
 
-        snake.score /= config.PLAYS_PER_GEN  # getting the average score
-        return snake
+    def _new_population(self):
+        """ Creates a new population. """
+        self._segments = self._brain.genome_segments() if self._run_config.brain_weights_format == "int8" else None
+        self._parents = genome_buffer(self._size, self._brain.genome_size(), self._run_config.brain_dtype,
+                                      self._segments)
+        self._lineage = self._random_lineage(self._size)
+        self._scores = np.zeros(self._size)
+        self._selection_scores = self._scores
+        self._ages = np.zeros(self._size, dtype=np.int64)
+
+    def _random_lineage(self, n):
+        """ Returns the lineage records of n randomly generated genomes (initialized like the weights of a new network).
+        """
+        return random_lineage(self._rng.integers(2**63, size=n))
 
-    def _play(self):
-        """ Make each AI player play the game until it loses or the turn limit is exceeded. """
-        # resetting snakes
-        for snake in self._snakes:
-            snake.score = 0
-            snake.last_action = Action.LEFT
+    def _genome(self, index):
+        """ Builds the genome of an individual from its lineage record. """
+        return make_offspring(self._parents, self._lineage[index].item(), self._run_config.weights_mult_factor,
+                              self._segments)
 
-        # playing
-        proc_pool = multiprocessing.Pool(processes=multiprocessing.cpu_count())
-        results = proc_pool.map(self._play_process, self._snakes)
+    def _save_individual(self, index, gen, store):
+        """ Saves the neural network of an individual as the model of the given generation in the given ModelStore. """
+        self._brain.set_genome(self._genome(index))
+        store.put(gen, self._brain)
 
-        # waiting for all processes to finish
-        proc_pool.close()
-        proc_pool.join()
-        self._snakes = results
+    def _top_k(self, k, values):
+        """ Returns the indices of the k individuals with the highest given values, sorted by descending value. """
+        top = np.argpartition(-values, k - 1)[:k]
+        return top[np.argsort(-values[top])]
 
-        # sorting
-        self._snakes.sort(key=lambda s: s.score, reverse=True)
+    @staticmethod
+    def _play_process(task, run_config):
+        """ Simulates the playing of a single game with the given AI.
+
+        :param task: tuple containing the generation, the index of the individual (in the population), the index of the
+        game (among the individual's games in the generation), the individual's lineage record and the game's seed. The
+        individual's genome is built from its lineage record and the parents' genomes in shared memory.
+        :param run_config: the RunConfig with the settings of the game.
+        :return: a tuple containing the individual's index, the game's index, the score obtained, the number of turns
+        played, the reason why the game ended, the reason why it was preempted (None if it wasn't, see
+        evolution/budget.py), the descriptor of the individual's behaviour (None if novelty search is disabled) and a
+        snapshot of the worker's memory usage (None unless it's the worker's first task of the generation and memory
+        profiling is enabled, see evolution/memory.py).
+        """
+        gen, index, game, record, seed = task
+        brain = _cached_brain(run_config)
+        brain.set_genome(worker_genome((gen, index), record, run_config.weights_mult_factor))
+        snake = SnakeAI(brain, run_config=run_config)
+
+        recorder = BehaviourRecorder(run_config.board_size, run_config.novelty_grid) \
+            if run_config.novelty_weight > 0 else None
+        budget = EpisodeBudget(run_config, generation=_worker_budget)
+        turn, food_count, end_cause = play_game(snake, run_config, seed=seed, recorder=recorder, budget=budget)
+
+        descriptor = None
+        if recorder is not None:
+            descriptor = recorder.descriptor(food_count, end_cause)
+
+        memory = _worker_profiler.sample(gen) if _worker_profiler is not None else None
+        return index, game, snake.score, turn, end_cause, budget.reason, descriptor, memory
+
+    def _play(self, proc_pool, gen):
+        """ Make each AI player play the game until it loses or the turn limit is exceeded.
+
+        Each of the PLAYS_PER_GEN games of each individual is a separate task, so even small populations keep all the
+        workers busy. The tasks carry the individuals' lineage records instead of their genomes, which are built by the
+        workers. The tasks are sent to the workers in chunks (about 4 per worker, for load balancing) and the
+        individual's score is the average of the scores of its games. The results are stored by individual and game and
+        only averaged at the end, so they don't depend on the order in which the games finish.
+
+        :param proc_pool: the pool of worker processes used to simulate the games.
+        :param gen: the current generation (the seeds of the games are derived from it).
+        :return: the total number of turns played, a Counter with the number of games that reached the turn limit
+        ("turn_limit") or were preempted by each of the budgets (see evolution/budget.py) and a list with the snapshots
+        of the memory usage of the workers (empty unless memory profiling is enabled).
+        """
+        plays = self._run_config.plays_per_gen
+        n = len(self._lineage)
+        seeds = self._seeds.game_seeds(gen, n, plays)
+        lineage = self._lineage.tolist()
+        tasks = [(gen, i, g, lineage[i], int(seeds[i, g])) for i in range(n) for g in range(plays)]
+        chunk_size = max(1, len(tasks) // (4 * self._processes))
+        self._generation_budget.start()
+        results = proc_pool.imap_unordered(partial(self._play_process, run_config=self.game_config), tasks,
+                                           chunksize=chunk_size)
+
+        scores = np.zeros((n, plays))
+        descriptors = None
+        if self._novelty_archive is not None:
+            descriptors = np.zeros((n, plays, descriptor_size(self._run_config.novelty_grid)))
+
+        total_turns = 0
+        limits = Counter()
+        memory = []
+        for i, g, score, turns, end_cause, preempted, descriptor, worker_memory in results:
+            scores[i, g] = score
+            total_turns += turns
+            if end_cause == "turn_limit" or preempted is not None:
+                limits[end_cause if preempted is None else preempted] += 1
+            if descriptors is not None:
+                descriptors[i, g] = descriptor
+            if worker_memory is not None:
+                memory.append(worker_memory)
+
+        self._scores = scores.mean(axis=1)  # getting the average score
+        if descriptors is not None:
+            descriptors = descriptors.mean(axis=1)
+
+        # novelty
+        self._selection_scores = self._scores
+        if self._novelty_archive is not None:
+            self._novelty = self._novelty_archive.novelty(descriptors)
+            self._selection_scores = blend(self._scores, self._novelty, self._run_config.novelty_weight)
+            self._novelty_archive.add(descriptors)
+
+        self._ages += 1
+        return total_turns, limits, memory
 
     def evolve(self, num_generations):
+        """ Evolves the population for the given number of generations.
+
+        A one-line summary of each generation is printed to stdout. Detailed metrics are appended, in batches, to the
+        file "metrics.jsonl" in the population's output directory (see evolution/telemetry.py). The lineage records and
+        the scores of the individuals of each generation are appended to the file "lineage.jsonl". With memory_profiling
+        enabled in the population's run configuration, snapshots of the memory usage of the main process and of the workers are appended to "memory.jsonl"
+        (see evolution/memory.py).
+        """
         self._mass_extinction_counter = 0
         best_score = best_score_ever = 0
         best_score_gen = best_score_ever_gen = 0
-
-        for gen in range(num_generations):
-            print(
-                "\n\n< GENERATION %d/%d\n" % (gen+1, num_generations) +
-                "    Playing... ", end=""
-            )
-
-            self._play()
-            print("done! Best score: %d" % self._snakes[0].score)
-            self._snakes[0].save_brain(self._out_dir + "best_models/gen_%d" % gen)
-
-            total_score = 0
-            for s in self._snakes:
-                total_score += s.score
-
-            self._pop_fitness_history.append(total_score)
-            self._best_fitness_history.append(self._snakes[0].score)
-
-            if self._snakes[0].score > best_score:
-                best_score = self._snakes[0].score
-                best_score_gen = gen
-                self._mass_extinction_counter = 0
-
-                if self._snakes[0].score > best_score_ever:
-                    best_score_ever = self._snakes[0].score
-                    best_score_ever_gen = gen
-            else:
-                self._mass_extinction_counter += 1
-
-            print(
-                "    Total population score: %d\n" % total_score +
-                "    Mean population score: %.2f\n" % (total_score / len(self._snakes)) +
-                "    Individuals scores: " + str([s.score for s in self._snakes]) + "\n" +
-                "    Mutation rate: %.2f%%" % (100*self._mutation_rate()) + "\n" +
-                "    Best score ever: %d (gen %d)\n" % (best_score_ever, best_score_ever_gen) +
-                "    Cycle's best score: %d (gen %d)\n" % (best_score, best_score_gen) +
-                "    Mass extinction counter: %d/%d" % (self._mass_extinction_counter, config.MASS_EXTINCTION_THRESHOLD)
-            )
-
-            # mass extinction
-            if self._mass_extinction_counter >= config.MASS_EXTINCTION_THRESHOLD:
-                print("    MASS EXTINCTION IN PROGRESS... ", end="")
-                self._mass_extinction()
-                self._mass_extinction_counter = 0
-                best_score = 0
-
-            # reproduction
-            else:
-                print("    Reproducing best individuals... ", end="")
-                self._reward_based_reproduction()
-                print("done!")
-
-                kill_count = int(len(self._snakes) * config.RANDOM_KILL_PC)
-                print("    Predating %d individuals..." % kill_count, end="")
-
-                for i in range(kill_count):
-                    self._random_death()
-
-            print("done!\n/>")
+        flush_every = self._run_config.metrics_flush_generations
+        metrics = MetricsLogger(self._out_dir + "metrics.jsonl", flush_every=flush_every)
+        lineage_log = MetricsLogger(self._out_dir + "lineage.jsonl", flush_every=flush_every)
+        profiler = memory_log = None
+        if self._run_config.memory_profiling:
+            profiler = MemoryProfiler(top=self._run_config.memory_top_sites)
+            memory_log = MetricsLogger(self._out_dir + "memory.jsonl", flush_every=flush_every)
+        models = ModelStore(self._out_dir + "best_models/", flush_every=flush_every)
+        if self._curriculum is not None:
+            self._curriculum.save(self._out_dir + "curriculum.json")
+
+        # the parents' genomes are shared with the workers, which build the genomes of the individuals they evaluate
+        shared_parents = SharedGenomes(self._parents, self._segments)
+        self._parents = shared_parents.array
+        self._generation_budget = GenerationBudget(max_turns=self._run_config.generation_turn_budget,
+                                                   max_seconds=self._run_config.generation_time_budget)
+        proc_pool = multiprocessing.Pool(processes=self._processes, initializer=_init_worker,
+                                         initargs=(shared_parents.spec, self._generation_budget,
+                                                   self._run_config.memory_top_sites if profiler is not None else None))
+
+        try:
+            for gen in range(num_generations):
+                self._rng = self._seeds.generation(gen)
+                if self._optimizer is not None:
+                    store_genomes(self._parents, slice(None), self._optimizer.ask(), self._segments)
+                    self._lineage = copies(self._size)
+                    self._ages = np.zeros(self._size, dtype=np.int64)
+
+                start_time = time.time()
+                turns, limits, workers_memory = self._play(proc_pool, gen)
+                eval_time = time.time() - start_time
+
+                best = int(np.argmax(self._scores))
+                gen_best_score = self._scores[best]
+                self._save_individual(best, gen, models)
+                lineage_log.log({"generation": gen, **{k: self._lineage[k].tolist() for k in self._lineage.dtype.names},
+                                 "score": self._scores.tolist()})
+
+                total_score = float(self._scores.sum())
+
+                if gen_best_score > best_score:
+                    best_score = gen_best_score
+                    best_score_gen = gen
+                    self._mass_extinction_counter = 0
+
+                    if gen_best_score > best_score_ever:
+                        best_score_ever = gen_best_score
+                        best_score_ever_gen = gen
+                else:
+                    self._mass_extinction_counter += 1
+
+                mutation_rate = self._mutation_rate()
+                record = {
+                    "generation": gen,
+                    "time": time.time(),
+                    "size": len(self._scores),
+                    **score_stats(self._scores),
+                    "total": total_score,
+                    "mutation_rate": mutation_rate,
+                    "turns": turns,
+                    "eval_time": eval_time,
+                    "turns_per_sec": turns / eval_time if eval_time > 0 else 0,
+                    "best_score_ever": float(best_score_ever),
+                    "best_score_ever_gen": best_score_ever_gen,
+                    "cycle_best_score": float(best_score),
+                    "mass_extinction_counter": self._mass_extinction_counter,
+                    "best_age": int(self._ages[best]),
+                    "mean_age": float(self._ages.mean()),
+                    "turn_limit_games": limits["turn_limit"],
+                    "preempted_games": sum(limits[r] for r in PREEMPTION_REASONS),
+                    **{"preempted_" + r: limits[r] for r in PREEMPTION_REASONS},
+                }
+                if self._novelty_archive is not None:
+                    record["novelty_mean"] = float(self._novelty.mean())
+                    record["novelty_max"] = float(self._novelty.max())
+                    record["novelty_archive_size"] = len(self._novelty_archive)
+
+                print("< GENERATION %d/%d | best: %d | mean: %.2f | best ever: %d (gen %d) | %s | %d turns in %.2fs%s" % (
+                    gen + 1, num_generations, record["max"], record["mean"], best_score_ever, best_score_ever_gen,
+                    ("mutation rate: %.2f%%" % (100*mutation_rate)) if self._optimizer is None
+                    else ("sigma: %.4f" % self._optimizer.sigma), turns, eval_time,
+                    (" | %d games preempted" % record["preempted_games"]) if record["preempted_games"] > 0 else ""))
+
+                # optimizer step
+                if self._optimizer is not None:
+                    self._optimizer.tell(self._selection_scores)  # scores, or blend of scores and novelty
+                    record["event"] = "optimizer_step"
+                    record["sigma"] = float(self._optimizer.sigma)
+
+                # mass extinction
+                elif self._mass_extinction_counter >= self._run_config.mass_extinction_threshold:
+                    print("    MASS EXTINCTION!")
+                    self._mass_extinction(best)
+                    self._mass_extinction_counter = 0
+                    best_score = 0
+                    record["event"] = "mass_extinction"
+
+                # reproduction
+                else:
+                    self._reward_based_reproduction()
+                    kill_count = int(len(self._lineage) * self._run_config.random_kill_pc)
+                    self._random_death(kill_count)
+                    record["event"] = "reproduction"
+                    record["kill_count"] = kill_count
+
+                if len(self._lineage) != self._size:
+                    print("    WARNING: the population's size drifted to %d (expected: %d)!" % (
+                        len(self._lineage), self._size))
+                    record["size_drift"] = len(self._lineage) - self._size
+
+                # curriculum
+                if self._curriculum is not None:
+                    record["stage"] = self._curriculum.stage
+                    if self._curriculum.update(gen, record["p90"]):
+                        print("    CURRICULUM: advancing to stage %d/%d (board size: %dx%d)" % (
+                            self._curriculum.stage + 1, self._curriculum.num_stages, *self.game_config.board_size))
+                        self._curriculum.save(self._out_dir + "curriculum.json")
+                        self._mass_extinction_counter = 0
+                        best_score = 0  # the scores of different stages aren't comparable
+
+                # memory
+                if profiler is not None:
+                    main_memory = profiler.snapshot(gen)
+                    memory_log.log({"generation": gen, "main": main_memory, "workers": workers_memory})
+                    record["rss_main"] = main_memory["rss"]
+                    record["traced_main"] = main_memory["traced"]
+                    record["rss_workers"] = sum(m["rss"] for m in workers_memory)
+
+                metrics.log(record)
+        finally:
+            proc_pool.close()
+            proc_pool.join()
+            self._parents = np.array(self._parents)
+            shared_parents.close()
+            metrics.close()
+            lineage_log.close()
+            if memory_log is not None:
+                memory_log.close()
+            models.close()
 
         # writing info
+        cfg = self._run_config
         with open(self._out_dir + "info.txt", "w") as info:
             info.write(
                 "SIZE %d\n" % self._size +
                 "GENERATIONS %d\n" % num_generations +
-                "BOARD_SIZE %d %d\n" % config.BOARD_SIZE +
-                "SIGHT_RADIUS %d\n" % config.SIGHT_RADIUS +
-                "MAX_TURNS %d\n" % config.MAX_TURNS +
-                "MUTATION_RATE %.2f %.2f\n" % (config.MIN_MUTATION_RATE, config.MAX_MUTATION_RATE) +
-                "BRAIN_FORMAT: " + str(config.BRAIN_FORMAT) + "\n" +
-                "RANDOM_KILL_PC %.2f\n" % config.RANDOM_KILL_PC +
+                "BOARD_SIZE %d %d\n" % cfg.board_size +
+                "FEATURE_ENCODER %s\n" % cfg.feature_encoder +
+                "SIGHT_RADIUS %d\n" % cfg.sight_radius +
+                "MAX_TURNS %d\n" % cfg.max_turns +
+                "MAX_NO_FOOD_TURNS %d\n" % cfg.max_no_food_turns +
+                "USE_FOOD_LIST %s\n" % cfg.use_food_list +
+                "LIFE_SAVING %s\n" % cfg.life_saving +
+                "MUTATION_RATE %r %r\n" % (cfg.min_mutation_rate, cfg.max_mutation_rate) +
+                "BRAIN_FORMAT: " + str(list(cfg.brain_format)) + "\n" +
+                "RANDOM_KILL_PC %r\n" % cfg.random_kill_pc +
                 "BEST_SCORE_EVER %d\n" % best_score_ever +
-                "BEST_SCORE_EVER_GEN %d" % best_score_ever_gen
+                "BEST_SCORE_EVER_GEN %d\n" % best_score_ever_gen +
+                "SEED %d" % self.seed
             )
 
         # saving food list
         with open(self._out_dir + "base_food_list.txt", "w") as file:
             to_write = ""
-            for f in config.FOOD_POS_LIST:
+            for f in cfg.food_pos_list:
                 to_write += "%d %d\n" % f
             file.write(to_write[:-1])
 
@@ -239,59 +528,262 @@ class SnakePopulation:
         The mutation rate is higher when the population hasn't been improving its fitness much in the past few
         generations and lower when the population has been improving.
         """
-        rate = (1/config.MASS_EXTINCTION_THRESHOLD) * (1 + self._mass_extinction_counter) * config.MAX_MUTATION_RATE
-        return max(rate, config.MIN_MUTATION_RATE)
+        cfg = self._run_config
+        rate = (1/cfg.mass_extinction_threshold) * (1 + self._mass_extinction_counter) * cfg.max_mutation_rate
+        return max(rate, cfg.min_mutation_rate)
+
+    def _next_generation(self, best, children, children_ages=None):
+        """ Replaces the population with the given best individual (kept at index 0) followed by the given children.
+
+        The genomes of the individuals referenced by the children's lineage records (and the best one's genome) are
+        built and stored in the parents' buffer, at the individuals' indices, so the lineage records of the new
+        generation refer to the indices of their parents in the current one. The other genomes are never built here.
+
+        :param best: index of the best individual of the current generation.
+        :param children: lineage records of the children (parents and mates are indices of the current generation).
+        :param children_ages: optional vector with the ages of the children.
+        """
+        keep = np.unique(np.concatenate([[best], children["parent"], children["mate"]]))
+        keep = keep[keep >= 0]
+        # built before the buffer is overwritten
+        store_genomes(self._parents, keep, np.stack([self._genome(i) for i in keep]), self._segments)
+
+        self._lineage = np.concatenate([copies(best + 1)[best:], children])
+        self._scores = np.concatenate([self._scores[best:best + 1], np.zeros(len(children))])
+        self._ages = np.concatenate([self._ages[best:best + 1],
+                                     children_ages if children_ages is not None else np.zeros(len(children), np.int64)])
+
+    def _children(self, parents, mates=None):
+        """ Returns the lineage records of the mutated children of the given parents (and mates), with the current
+        mutation rate and new random seeds. """
+        children = random_lineage(self._rng.integers(2**63, size=len(parents)))
+        children["parent"] = parents
+        if mates is not None:
+            children["mate"] = mates
+        children["rate"] = self._mutation_rate()
+        return children
 
     def _reward_based_reproduction(self):
-        """ Reproduction method: reward-based selection. """
-        assert len(self._snakes) >= 10
-
-        p = [0.3, 0.25, 0.2, 0.15, 0.1] + [0] * (len(self._snakes) - 5)
-        new_snakes = [self._snakes[0]]  # always keeps the best snake
-
-        for _ in range(len(self._snakes) - 1):
-            chosen = self._snakes[np.random.choice(len(self._snakes), p=p)]
-            new_snakes.append(
-                SnakeAI(
-                    create_brain(mutate_weights(chosen.brain.get_weights(), self._mutation_rate()))
-                )
-            )
+        """ Reproduction method: reward-based selection.
+
+        The parents of all the children are drawn at once from the 5 best individuals (by score or, with novelty search,
+        by the blend of score and novelty), with probabilities proportional to their rank. The individual with the best
+        score is always kept (at index 0).
+        """
+        assert len(self._lineage) >= 10
 
-        self._snakes = new_snakes
+        top = self._top_k(5, self._selection_scores)
+        parents = self._rng.choice(top, size=len(self._lineage) - 1, p=[0.3, 0.25, 0.2, 0.15, 0.1])
+        self._next_generation(int(np.argmax(self._scores)), self._children(parents))
 
     def _elitist_reproduction(self):
         """ Reproduction method: elitism. """
-        best = self._snakes[0]
-        new_snakes = [best]  # always keeps the best snake
+        best = int(np.argmax(self._scores))
+        others = np.delete(np.arange(len(self._lineage)), best)
+        self._next_generation(best, self._children(np.full(len(others), best), mates=others))
+
+    def _random_death(self, count):
+        """ Randomly kills some of the population's individuals, replacing them with randomly generated ones.
 
-        mut_rate = self._mutation_rate()
-        for s in self._snakes[1:]:
-            new_weights = mate_weights(best.brain.get_weights(), s.brain.get_weights(), mut_rate)
-            new_snakes.append(SnakeAI(create_brain(new_weights)))
+        The best individual won't be considered for removal. It must be located at the index 0 of the population.
 
-        self._snakes = new_snakes
+        :param count: number of individuals to be killed.
+        """
+        victims = 1 + self._rng.choice(len(self._lineage) - 1, size=count, replace=False)
+        self._lineage[victims] = self._random_lineage(count)
+        self._scores[victims] = 0
+        self._ages[victims] = 0
 
-    def _random_death(self):
-        """ Randomly kills one of the population's individuals, replacing it with a randomly generated one.
+    def _mass_extinction(self, best):
+        """ Kills all the individuals of the current population (except for the best one) and generates new ones.
 
-        The best individual won't be considered for removal. It must be located at the index 0 of "self._snakes".
+        :param best: index of the best individual of the population.
         """
-        i = np.random.randint(1, len(self._snakes))
-        del self._snakes[i]
-        self._snakes.append(SnakeAI(create_brain()))
+        self._next_generation(best, self._random_lineage(self._size - 1))
+
+
+# parsers of the settings recorded in a population's "info.txt" file: map the key of each entry to a function that
+# receives its values (strings) and returns the corresponding fields of a RunConfig
+INFO_SETTINGS = {
+    "BOARD_SIZE": lambda v: {"board_size": tuple(int(i) for i in v)},
+    "FEATURE_ENCODER": lambda v: {"feature_encoder": v[0]},
+    "SIGHT_RADIUS": lambda v: {"sight_radius": int(v[0])},
+    "MAX_TURNS": lambda v: {"max_turns": int(v[0])},
+    "MAX_NO_FOOD_TURNS": lambda v: {"max_no_food_turns": int(v[0])},
+    "USE_FOOD_LIST": lambda v: {"use_food_list": v[0] == "True"},
+    "LIFE_SAVING": lambda v: {"life_saving": v[0] == "True"},
+    "MUTATION_RATE": lambda v: {"min_mutation_rate": float(v[0]), "max_mutation_rate": float(v[1])},
+    "BRAIN_FORMAT": lambda v: {"brain_format": tuple(int(i) for i in "".join(v).strip("[]").split(",") if i != "")},
+    "RANDOM_KILL_PC": lambda v: {"random_kill_pc": float(v[0])},
+    "SEED": lambda v: {"seed": int(v[0])},
+}
+
+
+def read_population_info(pop_dir):
+    """ Reads the "info.txt" file written at the end of the evolution of a population.
+
+    :param pop_dir: the population's output directory.
+    :return: a tuple containing the RunConfig of the population (the settings recorded in the file, see INFO_SETTINGS,
+    and the base food list are read from the population's directory, the other settings come from config.py) and a
+    dictionary mapping the key of each entry of the file to its values (as strings). Files written before the feature
+    encoders were added are read with the "window" encoder.
+    """
+    with open(os.path.join(pop_dir, "info.txt"), "r") as file:
+        info = {line.split()[0].rstrip(":"): line.split()[1:] for line in file if line.strip() != ""}
+
+    settings = {"feature_encoder": "window"}
+    for key, parse in INFO_SETTINGS.items():
+        if key in info:
+            settings.update(parse(info[key]))
+
+    food_pathname = os.path.join(pop_dir, "base_food_list.txt")
+    if os.path.isfile(food_pathname):
+        with open(food_pathname, "r") as file:
+            settings["food_pos_list"] = [tuple(int(i) for i in line.split()) for line in file if line.strip() != ""]
+
+    return RunConfig.from_config(**settings), info
+
+
+def new_game(run_config, seed=None):
+    """ Returns the GameLogicHandler of a new game played by an AI player, with the given settings (RunConfig) and seed.
+    """
+    return GameLogicHandler(food_list=list(run_config.food_pos_list) if run_config.use_food_list else None,
+                            run_config=run_config, seed=seed)
+
+
+class GameProgress:
+    """ Keeps track of a game played by an AI player: scores each of its turns and tells when (and why) it ends.
+
+    All the games of AI players are scored by this class (see play_game() and evolution/mosaic_viewer.py), so the scores
+    displayed or exported always match the ones obtained in training.
+    """
+
+    def __init__(self, handler, run_config):
+        """ Constructor.
+
+        :param handler: the GameLogicHandler of the game.
+        :param run_config: the RunConfig with the settings of the game.
+        """
+        self._handler = handler
+        self._run_config = run_config
+        self._last_food_dist = handler.abs_food_dist()
+        self.turn = self.last_food_turn = self.food_count = 0
+        self.last_state = None
+
+    @property
+    def dead(self):
+        """ Whether the snake died. """
+        return self.last_state == GameLogicHandler.State.DEAD
+
+    @property
+    def over(self):
+        """ Whether the game is over: the snake died, reached the turn limit or starved. """
+        return self.dead or self.turn >= self._run_config.max_turns or \
+            (self.turn - self.last_food_turn) >= self._run_config.max_no_food_turns
+
+    @property
+    def end_cause(self):
+        """ The reason why the game ended ("wall", "body", "turn_limit" or "starvation"). """
+        return self._handler.death_cause if self.dead \
+            else "turn_limit" if self.turn >= self._run_config.max_turns else "starvation"
+
+    def score_turn(self, state):
+        """ Accounts for a turn of the game.
+
+        :param state: the state returned by GameLogicHandler.update() in the turn.
+        :return: the points obtained by the snake in the turn.
+        """
+        new_food_dist = self._handler.abs_food_dist()
+        if state == GameLogicHandler.State.FOOD_EATEN:
+            points = self._run_config.food_score
+            self.last_food_turn = self.turn
+            self.food_count += 1
+        else:
+            points = self._run_config.farther_from_food_score if new_food_dist >= self._last_food_dist \
+                else self._run_config.closer_to_food_score
+
+        self._last_food_dist = new_food_dist
+        self.last_state = state
+        self.turn += 1
+        return points
+
+
+def play_game(snake, run_config=None, seed=None, recorder=None, budget=None, on_turn=None):
+    """ Makes an AI player play a game until it loses or runs out of turns. The score obtained is added to snake.score.
+
+    :param snake: the AI player.
+    :param run_config: the RunConfig with the settings of the game. If None, the values in config.py are used.
+    :param seed: optional seed for the placement of the food (see GameLogicHandler).
+    :param recorder: optional BehaviourRecorder to which the positions visited by the snake's head are reported.
+    :param budget: optional EpisodeBudget (see evolution/budget.py). If it's exhausted, the game is stopped and the
+    snake keeps the score obtained so far.
+    :param on_turn: optional function called in each turn, before the snake's action is applied, with the turn, the
+    game's GameLogicHandler and the action.
+    :return: a tuple containing the number of turns played, the number of food items eaten and the reason why the
+    game ended (one of evolution.novelty.END_CAUSES).
+    """
+    run_config = run_config if run_config is not None else RunConfig.from_config()
+    game_handler = new_game(run_config, seed=seed)
+    progress = GameProgress(game_handler, run_config)
+    if budget is not None:
+        budget.start()
+
+    while not progress.over:
+        if budget is not None and budget.exhausted(progress.turn):
+            break
 
-    def _mass_extinction(self):
-        """ Kills all the individuals of the current population (except for the best one) and generates new ones. """
-        self._snakes = [self._snakes[0]]
-        for i in range(self._size):
-            self._snakes.append(SnakeAI(create_brain()))
+        move = snake.act(game_handler)
+        if on_turn is not None:
+            on_turn(progress.turn, game_handler, move)
+        snake.score += progress.score_turn(game_handler.update(move))
 
+        if recorder is not None:
+            recorder.visit(game_handler.head_pos)
 
-def create_brain(weights=None):
+    if budget is not None:
+        budget.finish(progress.turn)
+        if budget.reason is not None:
+            return progress.turn, progress.food_count, "budget"
+
+    return progress.turn, progress.food_count, progress.end_cause
+
+
+async def play_game_async(snake, predict, run_config=None):
+    """ Plays a game with an AI player whose brain is served elsewhere (e.g. by an InferenceServer). Many games can be
+    played concurrently, in the same event loop, so the server can batch their requests.
+
+    :param snake: the AI player (see SnakeAI.act_async()).
+    :param predict: coroutine function that receives the features of the current state of the game and returns the
+    outputs of the brain.
+    :param run_config: the RunConfig with the settings of the game. If None, the values in config.py are used.
+    :return: a tuple containing the score obtained and the number of turns played.
+    """
+    run_config = run_config if run_config is not None else RunConfig.from_config()
+    game_handler = new_game(run_config)
+    progress = GameProgress(game_handler, run_config)
+    while not progress.over:
+        move = await snake.act_async(game_handler, predict)
+        snake.score += progress.score_turn(game_handler.update(move))
+
+    return snake.score, progress.turn
+
+
+def create_brain(weights=None, run_config=None):
+    """ Creates a new neural network to be used by an AI player.
+
+    :param weights: optional set of weights for the network. If None, the weights are randomly initialized.
+    :param run_config: the RunConfig that defines the network's format. If None, the values in config.py are used.
+    :return: the new neural network.
+    """
+    run_config = run_config if run_config is not None else RunConfig.from_config()
     new_brain = NeuralNetwork(
-        layers_size=[config.NUM_FEATURES] + config.BRAIN_FORMAT + [4],
+        layers_size=[run_config.num_features] + list(run_config.brain_format) + [4],
         layers_activation="relu",
-        weights_multiplier=config.WEIGHTS_MULT_FACTOR
+        weights_multiplier=run_config.weights_mult_factor,
+        dtype=run_config.brain_dtype,
+        weights_format=run_config.brain_weights_format,
+        density=run_config.brain_density,
+        recurrent=run_config.recurrent_brain,
     )
     new_brain.layers[-1].activation = "sigmoid"
 
@@ -301,55 +793,67 @@ def create_brain(weights=None):
     return new_brain
 
 
-def mutate_weights(weights, rate, method="replace"):
-    """ Returns a mutated copy of the given set of weights.
+# budgets shared by the games of the current generation and memory profiler of a worker process of an evolution (see
+# _init_worker())
+_worker_budget = None
+_worker_profiler = None
 
-    :param weights: the weights of a neural network.
-    :param rate: the mutation rate.
-    :param method:
-    :return: a mutated copy of the set of weights.
-    """
-    # NUDGE
-    if method == "nudge":
-        mul = [np.random.uniform(low=(1-rate), high=(1+rate), size=w.shape) for w in weights]
-        return [a * b for a, b in zip(weights, mul)]
-
-    # REPLACE
-    elif method == "replace":
-        for w in weights:
-            for i in range(len(w)):
-                for j in range(len(w[i])):
-                    if random.random() < rate:
-                        w[i][j] = np.random.uniform(low=-1, high=1) * config.WEIGHTS_MULT_FACTOR
-        return weights
-
-    raise ValueError("Mutation method \"%s\" doesn't exist!" % method)
-
-
-def mate_weights(weights1, weights2, mutation_rate):
-    """ Sums each weight of one set with the corresponding weight of the other set. The result is divided by 2 and the
-    mutation rate is applied.
-
-    :param weights1: the first set of weights.
-    :param weights2: the second set of weights.
-    :param mutation_rate: the mutation rate.
-    :return: the resultant set of weights.
+
+def _init_worker(parents_spec, generation_budget, memory_top_sites=None):
+    """ Initializer of the worker processes of an evolution: maps the parents' genomes in shared memory (see
+    evolution/offspring.py), keeps the budgets shared by the games of each generation (see evolution/budget.py) and, if
+    memory_top_sites isn't None, starts profiling the worker's memory (see evolution/memory.py). """
+    global _worker_budget, _worker_profiler
+    attach_parents(*parents_spec)
+    _worker_budget = generation_budget
+    if memory_top_sites is not None:
+        _worker_profiler = MemoryProfiler(top=memory_top_sites)
+
+
+# neural networks reused by a worker process to simulate the games of different individuals (one per RunConfig)
+_brain_cache = {}
+
+
+def _cached_brain(run_config):
+    """ Returns a neural network with the format defined by the given RunConfig, reused across calls. """
+    brain = _brain_cache.get(run_config)
+    if brain is None:
+        brain = _brain_cache[run_config] = create_brain(run_config=run_config)
+    return brain
+
+
+def validate_brain_dtype(brain, dtype, run_config=None, num_games=5, seed=0):
+    """ Reports how often a reduced-precision copy of a brain would choose a different action than its float64 version.
+
+    The brain (in float64) plays a few games (with play_game(), so they're played like the games of the evolution) and
+    the features of every turn are recorded. Both versions of the network are then fed with the recorded features.
+
+    :param brain: the neural network to be validated.
+    :param dtype: the reduced-precision data type (e.g. "float32" or "float16").
+    :param run_config: the RunConfig used in the games. If None, the values in config.py are used.
+    :param num_games: number of games to be played.
+    :param seed: seed of the first game (the others use the following seeds).
+    :return: a tuple containing the fraction of turns in which the chosen actions diverge and the number of turns.
     """
-    n = [(w1 + w2)/2 for w1, w2 in zip(weights1, weights2)]
-    return mutate_weights(n, mutation_rate)
-
-
-def mount_features(game_handler):
-    food_dist = game_handler.rel_food_dist()
-    features = np.concatenate([
-            np.array([
-                    game_handler.angle_to_food(),
-                    food_dist[0],
-                    food_dist[1],
-                ]
-            ),
-            np.hstack(game_handler.board_area(config.SIGHT_RADIUS))
-        ]
-    )
+    run_config = run_config if run_config is not None else RunConfig.from_config()
+    reference = brain.astype(np.float64)
+    encoder = encoder_for(run_config)
+    samples = []
+
+    for game in range(num_games):
+        play_game(SnakeAI(reference, run_config=run_config), run_config, seed=seed + game,
+                  on_turn=lambda turn, handler, move: samples.append(encoder.encode(handler)))
+
+    return action_divergence(brain, np.array(samples), dtype), len(samples)
 
-    return features
+
+def mount_features(game_handler, run_config=None):
+    """ Mounts the features (input of the neural network) describing the current state of the given game.
+
+    :param game_handler: the GameLogicHandler of the game.
+    :param run_config: the RunConfig that defines the feature encoder (see evolution/features.py). If None, the game
+    handler's one is used.
+    :return: a numpy array with the features.
+    """
+    run_config = run_config if run_config is not None else game_handler.run_config
+    return encoder_for(run_config).encode(game_handler)
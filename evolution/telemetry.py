@@ -0,0 +1,91 @@
+""" Append-only stream of training metrics.
+
+Each record is written as a line of JSON (JSON lines format), so the stream can be followed while a run is still going
+(e.g. with "tail -f" or a dashboard polling the file) and parsed with read_metrics().
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+import json
+import time
+import numpy as np
+
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+
+class MetricsLogger:
+    """ Buffers metrics records in memory and appends them to a file in batches.
+
+    The buffer is flushed when it holds "flush_every" records or when "flush_interval" seconds have passed since the
+    last flush (checked when a new record is logged). Only complete lines are written to the file.
+    """
+
+    def __init__(self, pathname, flush_every=10, flush_interval=30.0):
+        self._pathname = pathname
+        self._flush_every = flush_every
+        self._flush_interval = flush_interval
+        self._buffer = []
+        self._last_flush = time.time()
+        self._file = open(pathname, "a")
+
+    @property
+    def pathname(self):
+        """ Returns the path to the file being written. """
+        return self._pathname
+
+    def log(self, record):
+        """ Appends a new record (dictionary) to the stream. """
+        self._buffer.append(json.dumps(record))
+        if len(self._buffer) >= self._flush_every or (time.time() - self._last_flush) >= self._flush_interval:
+            self.flush()
+
+    def flush(self):
+        """ Writes the buffered records to the file. """
+        if len(self._buffer) > 0:
+            self._file.write("\n".join(self._buffer) + "\n")
+            self._file.flush()
+            self._buffer = []
+        self._last_flush = time.time()
+
+    def close(self):
+        """ Flushes the buffered records and closes the file. """
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def score_stats(scores):
+    """ Returns a dictionary with summary statistics (min, mean, max and quantiles) of the given scores. """
+    scores = np.asarray(scores, dtype=np.float64)
+    stats = {
+        "min": float(scores.min()),
+        "mean": float(scores.mean()),
+        "max": float(scores.max()),
+    }
+    for q, v in zip(QUANTILES, np.quantile(scores, QUANTILES)):
+        stats["p%d" % round(100*q)] = float(v)
+
+    return stats
+
+
+def read_metrics(pathname):
+    """ Reads the records of a metrics stream. An incomplete last line (being written) is ignored.
+
+    :param pathname: path to the metrics file.
+    :return: a list with the records (dictionaries), in the order they were logged.
+    """
+    records = []
+    with open(pathname, "r") as file:
+        for line in file:
+            if not line.endswith("\n"):
+                break
+            records.append(json.loads(line))
+
+    return records
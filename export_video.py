@@ -0,0 +1,249 @@
+""" Headless export of an AI player's game to a video (MP4) or an animated GIF.
+
+The game is played once, recording the snake's actions and a snapshot of the game's state every few thousand turns. The
+episode is then split into segments (one per snapshot), which are replayed and rasterized in parallel processes, without
+opening any window: each board is mapped to the colors of config.COLOR_MAP through a lookup table (see
+evolution/mosaic_viewer.py) and scaled into a frame buffer that's reused for all the frames of the segment. The frames
+are piped, as raw RGB bytes, to an ffmpeg process that encodes the segment. Finally, the segments are concatenated (and,
+for GIFs, converted with a palette built from the whole video).
+
+ffmpeg must be installed (or the imageio-ffmpeg package, which bundles it: "pip install imageio-ffmpeg").
+
+Usage examples:
+    python export_video.py ./evolution/populations/sample_pop/ --out best.mp4
+    python export_video.py ./evolution/populations/pop_1/ --gen 120 --seed 3 --out gen_120.gif --every 2 --fps 30
+    python export_video.py ./evolution/pre_trained_models/gen_99 --config my_run.json --out gen_99.mp4
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+import argparse
+import copy
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+import config
+from evolution.batch_runner import load_run_config, to_run_config
+from evolution.mosaic_viewer import color_lut
+from evolution.snake_ai import SnakeAI, play_game, read_population_info
+from game_logic_handler import Action
+from neural_network.model_store import ModelStore
+from neural_network.neural_network import NeuralNetwork
+from run_config import RunConfig
+
+
+# encoding of the segments (x264 needs even dimensions) and of the final file, by the output's extension
+SEGMENT_ARGS = {
+    ".mp4": ("mp4", ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", "libx264", "-preset", "veryfast", "-crf", "18",
+                     "-pix_fmt", "yuv420p"]),
+    ".gif": ("mkv", ["-c:v", "ffv1"]),  # lossless, so the GIF's palette only has the game's colors
+}
+FINAL_ARGS = {
+    ".mp4": ["-c", "copy"],
+    ".gif": ["-filter_complex", "split[a][b];[a]palettegen[p];[b][p]paletteuse=dither=none", "-loop", "0"],
+}
+
+
+def ffmpeg_exe():
+    """ Returns the path to the ffmpeg executable: the one bundled with imageio-ffmpeg, if it's installed, or the one in
+    the PATH. """
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        exe = shutil.which("ffmpeg")
+        if exe is None:
+            raise RuntimeError("ffmpeg wasn't found! Install it or run \"pip install imageio-ffmpeg\".")
+        return exe
+
+
+class FrameRenderer:
+    """ Rasterizes game boards into RGB frames, reusing the same buffers for every frame. """
+
+    def __init__(self, board_shape, cell_size):
+        """ Constructor.
+
+        :param board_shape: shape (rows, columns) of the boards.
+        :param cell_size: size (in pixels) of each cell of the boards.
+        """
+        h, w = board_shape
+        self._lut = color_lut()
+        self._codes = np.empty((h, w), dtype=np.intp)
+        self._cells = np.empty((h, w, 3), dtype=np.uint8)
+        self._frame = np.empty((h, cell_size, w, cell_size, 3), dtype=np.uint8)
+        self.frame = self._frame.reshape(h * cell_size, w * cell_size, 3)  # view of the buffer returned by render()
+
+    @property
+    def frame_size(self):
+        """ Returns the size (width, height), in pixels, of the frames. """
+        return self.frame.shape[1], self.frame.shape[0]
+
+    def render(self, grid, dead=False):
+        """ Rasterizes a board (int8 array, see GameLogicHandler.grid) into the frame buffer and returns it. The buffer
+        is overwritten by the next call. """
+        self._codes[:] = grid.view(np.uint8)
+        if dead:
+            self._codes += 256
+        np.take(self._lut, self._codes, axis=0, out=self._cells)
+        self._frame[:] = self._cells[:, np.newaxis, :, np.newaxis]
+        return self.frame
+
+
+def record_episode(brain, run_config, seed=None, segment_turns=2000):
+    """ Plays a game (with play_game(), so it's scored like the games of the evolution), recording the snake's actions
+    and snapshots of the game's state.
+
+    :param brain: the neural network that controls the snake.
+    :param run_config: the RunConfig with the settings of the game.
+    :param seed: seed of the game (see GameLogicHandler).
+    :param segment_turns: number of turns between snapshots.
+    :return: a tuple containing the list of snapshots (copies of the game's GameLogicHandler, taken before the turns
+    0, segment_turns, 2*segment_turns, ...), a vector with the index (in Action) of the action of each turn, whether the
+    snake died and its score.
+    """
+    snake = SnakeAI(brain, run_config=run_config)
+    actions_list = list(Action)
+    snapshots, actions = [], []
+
+    def record(turn, handler, move):
+        if turn % segment_turns == 0:
+            snapshots.append(copy.deepcopy(handler))
+        actions.append(actions_list.index(move))
+
+    _, _, end_cause = play_game(snake, run_config, seed=seed, on_turn=record)
+    return snapshots, np.array(actions, dtype=np.int8), end_cause in ("wall", "body"), snake.score
+
+
+def replay_segment(snapshot, actions, last=False, dead=False):
+    """ Replays a segment of an episode, yielding its boards (the game's int8 grid, which is updated in place).
+
+    :param snapshot: the GameLogicHandler at the beginning of the segment (it's modified).
+    :param actions: the indices of the actions of the segment's turns.
+    :param last: whether this is the episode's last segment (if it is, the board after the last action is also
+    yielded).
+    :param dead: whether the snake died at the end of the episode.
+    :return: a generator of tuples containing the turn (within the segment), the board and whether the snake is dead.
+    """
+    actions_list = list(Action)
+    for turn, action in enumerate(actions):
+        yield turn, snapshot.grid, False
+        snapshot.update(actions_list[action])
+
+    if last:
+        yield len(actions), snapshot.grid, dead
+
+
+def render_segment(task):
+    """ Replays, rasterizes and encodes a segment of an episode (called in a worker process).
+
+    :param task: tuple containing the index of the segment's first turn, the snapshot of the game at that turn, the
+    actions of the segment, whether it's the episode's last segment, whether the snake died, the cell size, the number
+    of frames per second, the interval (in turns) between frames, the path of the segment's file and the ffmpeg
+    arguments of its encoding.
+    :return: the number of frames encoded.
+    """
+    first_turn, snapshot, actions, last, dead, cell_size, fps, every, pathname, codec_args = task
+    renderer = FrameRenderer(snapshot.grid.shape, cell_size)
+    w, h = renderer.frame_size
+    proc = subprocess.Popen([ffmpeg_exe(), "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                             "-s", "%dx%d" % (w, h), "-r", str(fps), "-i", "-", *codec_args, pathname],
+                            stdin=subprocess.PIPE)
+    frames = 0
+    try:
+        for turn, grid, is_dead in replay_segment(snapshot, actions, last, dead):
+            if (first_turn + turn) % every == 0 or is_dead:
+                proc.stdin.write(renderer.render(grid, is_dead).data)
+                frames += 1
+    finally:
+        proc.stdin.close()
+        if proc.wait() != 0:
+            raise RuntimeError("ffmpeg failed to encode \"%s\"!" % pathname)
+    return frames
+
+
+def export_episode(snapshots, actions, dead, out, cell_size=config.CELL_SIZE // 4, fps=config.FPS, every=1,
+                   segment_turns=2000, processes=None):
+    """ Renders a recorded episode (see record_episode()) to a video or GIF file.
+
+    :param out: path of the output file (its extension, ".mp4" or ".gif", defines the format).
+    :param cell_size: size (in pixels) of each cell of the board.
+    :param fps: frames per second of the output.
+    :param every: interval (in turns) between frames (e.g. 2 keeps every other turn).
+    :param segment_turns: number of turns between the snapshots of the episode.
+    :param processes: number of worker processes (default: CPU count).
+    :return: the number of frames written.
+    """
+    ext = os.path.splitext(out)[1].lower()
+    if ext not in SEGMENT_ARGS:
+        raise ValueError("Unsupported output format \"%s\"! Supported formats: %s." % (ext, str(list(SEGMENT_ARGS))))
+
+    part_ext, codec_args = SEGMENT_ARGS[ext]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        parts = [os.path.join(tmp_dir, "part_%d.%s" % (i, part_ext)) for i in range(len(snapshots))]
+        tasks = [(i * segment_turns, snapshot, actions[i * segment_turns:(i + 1) * segment_turns],
+                  i == len(snapshots) - 1, dead, cell_size, fps, every, parts[i], codec_args)
+                 for i, snapshot in enumerate(snapshots)]
+        processes = processes if processes is not None else multiprocessing.cpu_count()
+        with multiprocessing.Pool(processes=max(1, min(processes, len(tasks)))) as pool:
+            frames = sum(pool.imap_unordered(render_segment, tasks))
+
+        list_pathname = os.path.join(tmp_dir, "parts.txt")
+        with open(list_pathname, "w") as file:
+            file.write("".join("file '%s'\n" % p for p in parts))
+        subprocess.run([ffmpeg_exe(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_pathname,
+                        *FINAL_ARGS[ext], out], check=True)
+
+    return frames
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Renders a game of a saved model to an MP4 video or a GIF, without "
+                                                 "opening any window.")
+    parser.add_argument("source", help="a population's output directory or the path to a saved model")
+    parser.add_argument("--gen", type=int, default=None,
+                        help="generation of the population's model (default: the one with the best score ever)")
+    parser.add_argument("--config", default=None,
+                        help="JSON run configuration file with the settings of the game (default: the ones in the "
+                             "population's info.txt and config.py)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the game")
+    parser.add_argument("--out", default="episode.mp4", help="path of the output file (.mp4 or .gif)")
+    parser.add_argument("--cell-size", type=int, default=config.CELL_SIZE // 4,
+                        help="size (in pixels) of each cell of the board")
+    parser.add_argument("--fps", type=int, default=config.FPS, help="frames per second of the output")
+    parser.add_argument("--every", type=int, default=1, help="interval (in turns) between frames")
+    parser.add_argument("--segment-turns", type=int, default=2000, help="number of turns rendered by each task")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: CPU count)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if os.path.isdir(args.source):
+        run_config, info = read_population_info(args.source)
+        gen = args.gen if args.gen is not None else int(info["BEST_SCORE_EVER_GEN"][0])
+        brain = ModelStore(os.path.join(args.source, "best_models")).get(gen)
+    else:
+        run_config, brain = RunConfig.from_config(), NeuralNetwork.load(args.source)
+    if args.config is not None:
+        run_config = to_run_config(load_run_config(args.config))
+
+    start_time = time.time()
+    snapshots, actions, dead, score = record_episode(brain, run_config, seed=args.seed,
+                                                     segment_turns=args.segment_turns)
+    print("Episode played in %.2fs: %d turns, score %d (%s)." % (
+        time.time() - start_time, len(actions), score, "died" if dead else "survived"))
+
+    start_time = time.time()
+    frames = export_episode(snapshots, actions, dead, args.out, cell_size=args.cell_size, fps=args.fps,
+                            every=args.every, segment_turns=args.segment_turns, processes=args.processes)
+    print("%d frames rendered in %.2fs. Saved to: \"%s\"" % (frames, time.time() - start_time, args.out))
+
+
+if __name__ == "__main__":
+    main()
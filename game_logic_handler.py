@@ -3,39 +3,86 @@
 @author Gabriel Nogueira (Talendar)
 """
 
-from random import Random
 from enum import Enum
 from math import atan2, degrees
+from run_config import RunConfig
+import numpy as np
 import config
 
 
 class GameLogicHandler:
-    """ Handles the game's logic. Designed to be independent of the implementation of the game's graphics. """
+    """ Handles the game's logic. Designed to be independent of the implementation of the game's graphics.
 
-    def __init__(self, food_list=None):
-        self._snake_pos, self._board = self._new_board()
+    The board is stored as a numpy array with one byte (the code of the entity, see config.py) per cell. The number of
+    free cells is kept up to date as the snake moves, and new food is placed by rejection sampling, so the cost of a
+    turn doesn't grow with the size of the board.
+    """
+
+    # number of random cells tried when placing new food before falling back to scanning the whole board
+    FOOD_PLACEMENT_ATTEMPTS = 32
+
+    # number of random cells drawn at once (and buffered) for the placement of food
+    RANDOM_CELLS_BUFFER_SIZE = 64
+
+    def __init__(self, food_list=None, run_config=None, seed=None):
+        """ Constructor.
+
+        :param food_list: optional list with the positions in which the food will be placed (in order).
+        :param run_config: the RunConfig with the game's settings. If None, the values in config.py are used.
+        :param seed: optional seed for the placement of the food. Games with the same seed in which the snake moves in
+        the same way are identical.
+        """
+        self._run_config = run_config if run_config is not None else RunConfig.from_config()
+        self._snake_pos, self._board = self._new_board(self._run_config)
+        self._free_cells = int(np.count_nonzero(self._board == config.EMPTY))
         self._food_list = food_list.copy() if food_list is not None else []
 
-        self._random = Random()
+        self._rng = np.random.default_rng(seed)
+        self._random_cells, self._random_cells_pos = None, 0
         self._food_pos = None
         self._new_food()
         self._increasing_snake = False
-        self._random = Random()
+        self.death_cause = None  # "wall" or "body", set when the snake dies
 
     class State(Enum):
         """ Possible states for the GameLogicHandler. """
         DEAD, NO_FOOD, FOOD_EATEN = 0, 1, 2
 
+    @property
+    def run_config(self):
+        """ Returns the RunConfig with the game's settings. """
+        return self._run_config
+
     @property
     def board(self):
         """ Returns a copy of the matrix that represents the game board. """
         return self._board.copy()
 
+    @property
+    def grid(self):
+        """ Returns the numpy array (int8) that represents the game board, without copying it. It must not be modified.
+        """
+        return self._board
+
+    @property
+    def free_cells(self):
+        """ Returns the number of empty cells of the board. """
+        return self._free_cells
+
     @property
     def snake_pos(self):
         """ Returns a list containing the position of each of the snake's body parts (starting with the head). """
         return self._snake_pos.copy()
 
+    @property
+    def head_pos(self):
+        """ Returns the position of the snake's head. """
+        return self._snake_pos[0]
+
+    def cell(self, i, j):
+        """ Returns the entity at the given position of the board (without copying the board). """
+        return self._board[i, j]
+
     @property
     def food_pos(self):
         """ Returns the current position of the food. """
@@ -58,57 +105,76 @@ class GameLogicHandler:
 
     def angle_to_food(self):
         """ Approximation of the angle between the snake's head and the food (in degrees). """
-        x0, y0 = self._snake_pos[0][1] - config.BOARD_SIZE[1]/2, self._snake_pos[0][0] - config.BOARD_SIZE[0]/2
-        x1, y1 = self._food_pos[1] - config.BOARD_SIZE[1]/2, self._food_pos[0] - config.BOARD_SIZE[0]/2
+        board_size = self._run_config.board_size
+        x0, y0 = self._snake_pos[0][1] - board_size[1]/2, self._snake_pos[0][0] - board_size[0]/2
+        x1, y1 = self._food_pos[1] - board_size[1]/2, self._food_pos[0] - board_size[0]/2
         return -degrees(atan2( (y1 - y0), (x1 - x0) ))
 
     def board_area(self, radius):
-        """ Returns an area of the board. """
+        """ Returns an area of the board: a square matrix with the cells within the given radius of the snake's head.
+
+        As when indexing a list, negative indices wrap around the board, while cells beyond its last row or column are
+        returned as config.VOID.
+        """
         ci, cj = self._snake_pos[0]
-        area = []
-
-        for i in range(ci - radius, ci + radius + 1):
-            area.append([])
-            for j in range(cj - radius, cj + radius + 1):
-                try:
-                    area[-1].append(self._board[i][j])
-                except IndexError:
-                    area[-1].append(config.VOID)
-
-        # assertion start - todo: delete
-        count = 0
-        for r in area:
-            count += len(r)
-        assert count == (2*radius + 1)**2
-        # assertion end
+        h, w = self._board.shape
+        rows = np.arange(ci - radius, ci + radius + 1)
+        cols = np.arange(cj - radius, cj + radius + 1)
+
+        area = self._board[np.ix_(rows % h, cols % w)]
+        area[(rows < -h) | (rows >= h), :] = config.VOID
+        area[:, (cols < -w) | (cols >= w)] = config.VOID
         return area
 
+    def _random_cell(self):
+        """ Returns a random cell of the board, taken from a buffer of cells drawn at once. """
+        h, w = self._board.shape
+        if self._random_cells is None or self._random_cells_pos == len(self._random_cells):
+            self._random_cells = self._rng.integers(h * w, size=self.RANDOM_CELLS_BUFFER_SIZE).tolist()
+            self._random_cells_pos = 0
+
+        self._random_cells_pos += 1
+        return divmod(self._random_cells[self._random_cells_pos - 1], w)
+
+    def _random_free_slot(self):
+        """ Chooses a random empty cell, preferably one at least FOOD_SPAWN_MIN_DIST away from the snake's head.
+
+        A few random cells are tried first, which is enough unless the board is almost full. Otherwise, the empty cells
+        are found by scanning the board.
+        """
+        hi, hj = self._snake_pos[0]
+        min_dist = self._run_config.food_spawn_min_dist
+        for _ in range(self.FOOD_PLACEMENT_ATTEMPTS):
+            i, j = self._random_cell()
+            if self._board[i, j] == config.EMPTY and abs(hi - i) + abs(hj - j) >= min_dist:
+                return i, j
+
+        rows, cols = np.nonzero(self._board == config.EMPTY)
+        pref = np.abs(rows - hi) + np.abs(cols - hj) >= min_dist
+        if pref.any():
+            rows, cols = rows[pref], cols[pref]
+
+        k = self._rng.integers(len(rows))
+        return int(rows[k]), int(cols[k])
+
     def _new_food(self):
         if len(self._food_list) == 0:
-            pref_free_slots = []
-            other_free_slots = []
-            for r in range(len(self._board)):
-                for c in range(len(self._board[r])):
-                    if self._board[r][c] == config.EMPTY:
-                        d = abs(self._snake_pos[0][0] - r) + abs(self._snake_pos[0][1] - c)
-                        if d >= config.FOOD_SPAWN_MIN_DIST:
-                            pref_free_slots.append((r, c))
-                        else:
-                            other_free_slots.append((r, c))
-
-            slots = pref_free_slots if len(pref_free_slots) > 0 else other_free_slots
-            if len(slots) == 0:
+            if self._free_cells == 0:
                 self._food_pos = None
                 raise AssertionError("NO FREE SLOT AVAILABLE FOR PLACING THE NEW FOOD!")
 
-            self._food_list.append(self._random.choice(slots))
+            self._food_list.append(self._random_free_slot())
 
         i, j = self._food_list.pop(0)
-        if self._board[i][j] == config.SNAKE_HEAD or self._board[i][j] == config.SNAKE_BODY or self._board[i][j] == config.WALL:
+        if not (0 <= i < self._board.shape[0] and 0 <= j < self._board.shape[1]):
+            self._new_food()  # outside of the board (e.g. a smaller board of a curriculum)
+        elif self._board[i, j] == config.SNAKE_HEAD or self._board[i, j] == config.SNAKE_BODY or self._board[i, j] == config.WALL:
             self._new_food()
         else:
             self._food_pos = i, j
-            self._board[i][j] = config.FOOD
+            if self._board[i, j] == config.EMPTY:
+                self._free_cells -= 1
+            self._board[i, j] = config.FOOD
 
     def new_head_pos(self, action):
         """ Calculates the new position to be taken by the snake. """
@@ -125,15 +191,18 @@ class GameLogicHandler:
 
     def _move_snake(self, pos):
         """ Moves the snake. """
-        self._board[self._snake_pos[0][0]][self._snake_pos[0][1]] = config.SNAKE_BODY
-        self._board[pos[0]][pos[1]] = config.SNAKE_HEAD
+        if self._board[pos] == config.EMPTY:
+            self._free_cells -= 1
+        self._board[self._snake_pos[0]] = config.SNAKE_BODY
+        self._board[pos] = config.SNAKE_HEAD
 
         new_tail = None
         if self._increasing_snake:
             new_tail = self._snake_pos[-1]
             self._increasing_snake = False
         else:
-            self._board[self._snake_pos[-1][0]][self._snake_pos[-1][1]] = config.EMPTY
+            self._board[self._snake_pos[-1]] = config.EMPTY
+            self._free_cells += 1
 
         for i in range(len(self._snake_pos) - 1, 0, -1):
             self._snake_pos[i] = self._snake_pos[i - 1]
@@ -144,10 +213,12 @@ class GameLogicHandler:
 
     def update(self, action):
         i, j = self.new_head_pos(action)
-        if self._board[i][j] == config.WALL or self._board[i][j] == config.SNAKE_BODY:
+        entity = self._board[i, j]
+        if entity == config.WALL or entity == config.SNAKE_BODY:
+            self.death_cause = "wall" if entity == config.WALL else "body"
             return self.State.DEAD  # game over
 
-        food = (self._board[i][j] == config.FOOD)
+        food = (entity == config.FOOD)
         self._move_snake((i, j))
 
         if food:
@@ -158,17 +229,16 @@ class GameLogicHandler:
         return self.State.NO_FOOD
 
     @staticmethod
-    def _new_board():
-        b = [[config.WALL] * config.BOARD_SIZE[0]]
-        for i in range(config.BOARD_SIZE[1] - 2):
-            b.append([config.WALL] + [config.EMPTY] * (config.BOARD_SIZE[0] - 2) + [config.WALL])
-        b.append([config.WALL] * config.BOARD_SIZE[0])
+    def _new_board(run_config):
+        board_size = run_config.board_size
+        b = np.full((board_size[1], board_size[0]), config.WALL, dtype=np.int8)
+        b[1:-1, 1:-1] = config.EMPTY
 
-        i, j = int(config.BOARD_SIZE[1] / 2), int(config.BOARD_SIZE[0] / 2)
+        i, j = int(board_size[1] / 2), int(board_size[0] / 2)
         snake_pos = [(i, j)]
-        b[i][j] = config.SNAKE_HEAD
-        for count in range(1, config.INITIAL_SNAKE_SIZE):
-            b[i][j + count] = config.SNAKE_BODY
+        b[i, j] = config.SNAKE_HEAD
+        for count in range(1, run_config.initial_snake_size):
+            b[i, j + count] = config.SNAKE_BODY
             snake_pos.append((i, j + count))
 
         return snake_pos, b
@@ -3,22 +3,37 @@
 @author Gabriel Nogueira (Talendar)
 """
 
-from game_logic_handler import *
+from game_logic_handler import Action
 import pygame
 import config
 
 
+def get_display(size):
+    """ Returns the display surface, only recreating it (with pygame.display.set_mode()) if its size is different from
+    the given one. Screens and menus of the same size share the same surface. """
+    display = pygame.display.get_surface()
+    if display is None or display.get_size() != tuple(size):
+        display = pygame.display.set_mode(size)
+    return display
+
+
 class GameScreen:
     """ Handles the drawing on the game screen. """
 
+    # font and images shared by all the screens (loaded by the first one)
+    _FONT = None
+    _ARROWS_IMGS = None
+
     def __init__(self, size=config.SCREEN_SIZE):
         self._size = size
-        self._display = pygame.display.set_mode(size)
-        self._FONT = pygame.font.SysFont(pygame.font.get_default_font(), 32)
-        self._arrows_imgs = [(
-                pygame.transform.scale(pygame.image.load("./imgs/arrow_%s_inactive.png" % s), (52, 52)),
-                pygame.transform.scale(pygame.image.load("./imgs/arrow_%s_active.png" % s), (52, 52)),
-            ) for s in ["up", "down", "left", "right"]]
+        self._display = get_display(size)
+        if GameScreen._FONT is None:
+            GameScreen._FONT = pygame.font.SysFont(pygame.font.get_default_font(), 32)
+            GameScreen._ARROWS_IMGS = [(
+                    pygame.transform.scale(pygame.image.load("./imgs/arrow_%s_inactive.png" % s), (52, 52)),
+                    pygame.transform.scale(pygame.image.load("./imgs/arrow_%s_active.png" % s), (52, 52)),
+                ) for s in ["up", "down", "left", "right"]]
+        self._arrows_imgs = GameScreen._ARROWS_IMGS
 
     def draw(self, board, score, turn, fps, gen, alive, action, start_msg=False):
         """ Draws the game on the screen. """
@@ -1,17 +1,21 @@
 """ This program uses a genetic algorithm to create an AI capable of playing the Snake Game.
 
+The GUI stack (pygame, pygame_menu and tkinter) is imported inside the main guard, so that processes spawned by the
+training code (which re-import this module) don't load it. For headless training, use train.py instead.
+
 @author Gabriel Nogueira (Talendar)
 """
 
 import os
-os.environ['SDL_VIDEO_CENTERED'] = '1'
-
-import pygame
-from menus import MainMenu
 import config
 
 
 if __name__ == "__main__":
+    os.environ['SDL_VIDEO_CENTERED'] = '1'
+
+    import pygame
+    from menus import MainMenu
+
     pygame.init()
     pygame.display.set_caption('SnakeAI by Talendar')
     MainMenu(config.MENU_HEIGHT, config.MENU_WIDTH, 'SnakeAI by Talendar')
@@ -6,11 +6,9 @@
 import pygame
 import pygame_menu
 
-import tkinter as tk
-from tkinter.filedialog import askopenfilename, askdirectory
-
 import config
 from snake_game import SnakeGame
+from game_screen import get_display
 from player import HumanPlayer
 from evolution.snake_ai import SnakePopulation
 from evolution.evolution_visualizer import EvolutionVisualizer
@@ -23,7 +21,7 @@ class MainMenu:
         self._height = height
         self._theme = theme
 
-        self._screen = pygame.display.set_mode((width, height))
+        self._screen = get_display((width, height))
         self._menu = pygame_menu.Menu(height, width, title, theme=theme)
 
         self._menu.add_button('Play', self._play_game)
@@ -37,25 +35,22 @@ class MainMenu:
 
     def _play_game(self):
         SnakeGame(HumanPlayer()).start()
-        pygame.display.set_mode((self._width, self._height))
+        get_display((self._width, self._height))
 
     def _evolve(self):
-        EvolutionMenu(self._height, self._width, theme=self._theme)
-        pygame.display.set_mode((self._width, self._height))
+        EvolutionMenu(self._height, self._width, theme=self._theme)  # same size: the display is reused
 
     def _visualize(self):
         VisualizationMenu(self._height, self._width, theme=self._theme)
-        pygame.display.set_mode((self._width, self._height))
 
     def _settings(self):
         SettingsMenu(self._height, self._width, theme=self._theme)
-        pygame.display.set_mode((self._width, self._height))
 
 
 class EvolutionMenu:
     def __init__(self, height, width, title="Evolution Config", theme=pygame_menu.themes.THEME_BLUE):
         self._width, self._height = width, height
-        self._screen = pygame.display.set_mode((width, height))
+        self._screen = get_display((width, height))
         self._menu = pygame_menu.Menu(height, width, title, theme=theme)
 
         self._ev_button = self._menu.add_button("Evolve!", self._evolve)
@@ -78,6 +73,8 @@ class EvolutionMenu:
         self._menu.mainloop(self._screen)
 
     def _select_file(self):
+        import tkinter as tk
+        from tkinter.filedialog import askopenfilename
         root = tk.Tk()
         self._base_model_path = askopenfilename(initialdir="./evolution/pre_trained_models")
         root.destroy()
@@ -96,19 +93,19 @@ class EvolutionMenu:
                                     None if self._fs_button.get_title() == "Base model: none"
                                     else nn.NeuralNetwork.load(self._base_model_path)))
 
-        self._screen = pygame.display.set_mode((380, 90))
+        self._screen = get_display((380, 90))
         self._screen.fill((0, 0, 0))
         self._screen.blit(pygame.font.SysFont("monospace", 24, bold=True).render("Evolving...", False, (255, 247, 0)), (10, 20))
         self._screen.blit(pygame.font.SysFont("monospace", 16).render("(check real time logging on stdout)", False, (255, 247, 0)), (8, 55))
         pygame.display.update()
         pop.evolve(self._gens)
-        pygame.display.set_mode((self._width, self._height))
+        get_display((self._width, self._height))
 
 
 class VisualizationMenu:
     def __init__(self, height, width, title="Visualize", theme=pygame_menu.themes.THEME_BLUE):
         self._width, self._height = width, height
-        self._screen = pygame.display.set_mode((width, height))
+        self._screen = get_display((width, height))
         self._menu = pygame_menu.Menu(height, width, title, theme=theme)
 
         self._vis_button = self._menu.add_button("Visualize!", self._visualize)
@@ -128,6 +125,8 @@ class VisualizationMenu:
         self._menu.mainloop(self._screen)
 
     def _select_dir(self):
+        import tkinter as tk
+        from tkinter.filedialog import askdirectory
         root = tk.Tk()
         self._pop_dir = askdirectory(initialdir="./evolution/populations")
         root.destroy()
@@ -143,13 +142,13 @@ class VisualizationMenu:
 
     def _visualize(self):
         self._pop.start(self._gen)
-        pygame.display.set_mode((self._width, self._height))
+        get_display((self._width, self._height))
 
 
 class SettingsMenu:
     def __init__(self, height, width, title="Settings", theme=pygame_menu.themes.THEME_BLUE):
         self._width, self._height = width, height
-        self._screen = pygame.display.set_mode((width, height))
+        self._screen = get_display((width, height))
         self._menu = pygame_menu.Menu(height, width, title, theme=theme)
 
         def update_fps(f): config.FPS = f
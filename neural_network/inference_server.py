@@ -0,0 +1,212 @@
+""" Asynchronous inference service for neural networks.
+
+Many clients (e.g. games being played at the same time) send single samples to the server, which gathers the requests
+for the same network into micro-batches and feeds each batch to the network at once (see NeuralNetwork.predict_batch()),
+replacing many matrix-vector products by a single matrix-matrix product. A batch is run as soon as it's full or when the
+oldest request in it has waited for "max_latency" seconds.
+
+The server can be used in-process, by awaiting InferenceServer.predict(), or by other processes, over a Unix socket
+(see InferenceServer.serve() and InferenceClient). To run a standalone server:
+
+    python -m neural_network.inference_server --socket /tmp/snake.sock --model best=path/to/best_models/gen_10
+
+Recurrent networks aren't supported, since the samples of a batch don't belong to fixed sequences.
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+from neural_network.neural_network import NeuralNetwork
+import argparse
+import asyncio
+import struct
+import numpy as np
+
+
+# request: length of the model's name and number of features; response: number of outputs (-1 on errors)
+_REQUEST_HEADER = struct.Struct("!HI")
+_RESPONSE_HEADER = struct.Struct("!i")
+_ERROR_HEADER = struct.Struct("!H")
+_WIRE_DTYPE = np.dtype(">f8")
+
+
+class InferenceServer:
+    """ Serves predictions of a set of neural networks, batching the concurrent requests for each of them. """
+
+    def __init__(self, max_batch_size=256, max_latency=0.001):
+        """ Constructor.
+
+        :param max_batch_size: maximum number of samples fed to a network at once.
+        :param max_latency: maximum time (in seconds) a request waits for others to join its batch. With 0, a batch
+        only includes the requests made before the server gets to run it, which is the best choice when all the clients
+        are in the same process (their requests are made as soon as the event loop lets them run).
+        """
+        self._max_batch_size = max_batch_size
+        self._max_latency = max_latency
+        self._models = {}
+        self._queues, self._arrivals, self._workers = {}, {}, {}
+        self._batch_count = self._request_count = 0
+
+    @property
+    def models(self):
+        """ Returns the names of the networks being served. """
+        return list(self._models)
+
+    @property
+    def mean_batch_size(self):
+        """ Returns the average number of samples per batch run so far. """
+        return self._request_count / self._batch_count if self._batch_count > 0 else 0
+
+    def add_model(self, name, net):
+        """ Starts serving the given network under the given name. """
+        if net.recurrent:
+            raise ValueError("Recurrent networks can't be served!")
+        self._models[name] = net
+
+    def load_model(self, name, pathname, dtype=None):
+        """ Loads a network from a file (see NeuralNetwork.load()) and starts serving it under the given name. """
+        self.add_model(name, NeuralNetwork.load(pathname, dtype=dtype))
+
+    async def predict(self, name, features):
+        """ Feeds a sample to one of the served networks.
+
+        :param name: the name of the network.
+        :param features: vector with the features of the sample.
+        :return: vector with the network's outputs.
+        """
+        if name not in self._models:
+            raise KeyError("Model \"%s\" isn't being served!" % name)
+
+        if name not in self._workers:
+            self._queues[name] = asyncio.Queue()
+            self._arrivals[name] = asyncio.Event()
+            self._workers[name] = asyncio.get_running_loop().create_task(self._run_batches(name))
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues[name].put_nowait((features, future))
+        self._arrivals[name].set()
+        return await future
+
+    async def _run_batches(self, name):
+        queue, arrival = self._queues[name], self._arrivals[name]
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self._max_latency
+            while len(batch) < self._max_batch_size:
+                while not queue.empty() and len(batch) < self._max_batch_size:
+                    batch.append(queue.get_nowait())
+
+                await asyncio.sleep(0)  # lets the clients that are ready make their requests
+                if queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+
+                    arrival.clear()
+                    try:
+                        await asyncio.wait_for(arrival.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+
+            try:
+                outputs = self._models[name].predict_batch(np.stack([features for features, _ in batch]))
+                for (_, future), out in zip(batch, outputs):
+                    if not future.done():
+                        future.set_result(out)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+            self._batch_count += 1
+            self._request_count += len(batch)
+
+    async def serve(self, socket_path):
+        """ Starts accepting requests over a Unix socket (see InferenceClient).
+
+        :param socket_path: path of the socket.
+        :return: the asyncio server (close it to stop serving).
+        """
+        return await asyncio.start_unix_server(self._handle_client, path=socket_path)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                name_len, num_features = _REQUEST_HEADER.unpack(await reader.readexactly(_REQUEST_HEADER.size))
+                name = (await reader.readexactly(name_len)).decode()
+                features = np.frombuffer(await reader.readexactly(num_features * _WIRE_DTYPE.itemsize),
+                                         dtype=_WIRE_DTYPE)
+                try:
+                    out = np.asarray(await self.predict(name, features), dtype=_WIRE_DTYPE)
+                    writer.write(_RESPONSE_HEADER.pack(len(out)) + out.tobytes())
+                except Exception as e:
+                    msg = str(e).encode()
+                    writer.write(_RESPONSE_HEADER.pack(-1) + _ERROR_HEADER.pack(len(msg)) + msg)
+                await writer.drain()
+        except asyncio.IncompleteReadError:
+            pass  # the client disconnected
+        finally:
+            writer.close()
+
+    def close(self):
+        """ Stops the tasks that run the batches. """
+        for worker in self._workers.values():
+            worker.cancel()
+        self._workers, self._queues, self._arrivals = {}, {}, {}
+
+
+class InferenceClient:
+    """ Connection to an InferenceServer over a Unix socket. Requests made concurrently through the same client are
+    sent one at a time; use one client per game to have them batched by the server. """
+
+    def __init__(self, socket_path):
+        self._socket_path = socket_path
+        self._reader, self._writer = None, None
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_unix_connection(self._socket_path)
+        return self
+
+    async def predict(self, name, features):
+        """ Feeds a sample to one of the networks served by the server (see InferenceServer.predict()). """
+        features = np.asarray(features, dtype=_WIRE_DTYPE).ravel()
+        name = name.encode()
+        async with self._lock:
+            self._writer.write(_REQUEST_HEADER.pack(len(name), len(features)) + name + features.tobytes())
+            await self._writer.drain()
+
+            count, = _RESPONSE_HEADER.unpack(await self._reader.readexactly(_RESPONSE_HEADER.size))
+            if count < 0:
+                msg_len, = _ERROR_HEADER.unpack(await self._reader.readexactly(_ERROR_HEADER.size))
+                raise RuntimeError((await self._reader.readexactly(msg_len)).decode())
+            return np.frombuffer(await self._reader.readexactly(count * _WIRE_DTYPE.itemsize), dtype=_WIRE_DTYPE)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._reader, self._writer = None, None
+
+
+async def _serve_forever(args):
+    server = InferenceServer(max_batch_size=args.max_batch_size, max_latency=args.max_latency)
+    for model in args.model:
+        name, pathname = model.split("=", 1)
+        server.load_model(name, pathname)
+
+    unix_server = await server.serve(args.socket)
+    print("Serving %s on \"%s\"" % (str(server.models), args.socket))
+    async with unix_server:
+        await unix_server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves neural networks over a Unix socket.")
+    parser.add_argument("--socket", required=True, help="path of the Unix socket")
+    parser.add_argument("--model", action="append", required=True, metavar="NAME=PATH",
+                        help="network to be served (can be repeated)")
+    parser.add_argument("--max-batch-size", type=int, default=256, help="maximum number of samples per batch")
+    parser.add_argument("--max-latency", type=float, default=0.001,
+                        help="maximum time (in seconds) a request waits for others to join its batch")
+    asyncio.run(_serve_forever(parser.parse_args()))
@@ -0,0 +1,167 @@
+""" Content-addressed storage of the models saved during an evolution.
+
+The best model of every generation is saved, but during plateaus it's the same model for many generations. Instead of
+one file per generation, each distinct network is saved once, in a file (blob) named after the hash of its contents
+(see NeuralNetwork.content_hash()), and a small index file maps each generation to the hash of its model:
+
+    best_models/
+        index.txt          # one "<generation> <hash>" line per generation
+        blobs/<hash>       # the networks, in the format of NeuralNetwork.save()
+
+Writes are buffered and flushed in batches. All the blobs of a batch are written before the first one is synced, so the
+kernel can write them back together; each blob is then synced once and published by a rename, followed by a single
+fsync of the blobs directory and one of the index per batch.
+Old directories, with one "gen_<N>" file per generation, can still be read. NeuralNetwork.load() also resolves paths
+like "best_models/gen_<N>" through the index, so code that expects such files keeps working.
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+import os
+import re
+
+
+INDEX_NAME = "index.txt"
+BLOBS_DIR = "blobs"
+
+_GEN_NAME = re.compile(r"gen_(\d+)")
+
+
+class ModelStore:
+    """ Content-addressed store of the models of a population (one per generation). """
+
+    def __init__(self, root, flush_every=10):
+        """ Constructor.
+
+        :param root: the store's directory (created when the first model is written, if it doesn't exist).
+        :param flush_every: number of generations buffered before the pending writes are flushed.
+        """
+        self._root = root
+        self._flush_every = flush_every
+
+        blobs_dir = os.path.join(root, BLOBS_DIR)
+        self._index = read_index(root)
+        self._blobs = set(os.listdir(blobs_dir)) if os.path.isdir(blobs_dir) else set()
+        self._pending_blobs = {}  # hash -> copy of the network
+        self._pending_index = []
+
+    @property
+    def root(self):
+        return self._root
+
+    def put(self, gen, net):
+        """ Records the given network as the model of the given generation. The network is only copied (and later
+        written) if the store doesn't have it yet.
+
+        :return: the hash of the network.
+        """
+        key = net.content_hash()
+        if key not in self._blobs and key not in self._pending_blobs:
+            self._pending_blobs[key] = net.astype(net.dtype)
+
+        self._index[gen] = key
+        self._pending_index.append((gen, key))
+        if len(self._pending_index) >= self._flush_every:
+            self.flush()
+        return key
+
+    def flush(self):
+        """ Writes the pending blobs and index entries to disk, syncing them once (see the module's description). """
+        blobs_dir = os.path.join(self._root, BLOBS_DIR)
+        os.makedirs(blobs_dir, exist_ok=True)
+        tmp_pathnames = {key: os.path.join(blobs_dir, key + ".tmp") for key in self._pending_blobs}
+        for key, net in self._pending_blobs.items():
+            net.save(tmp_pathnames[key])
+
+        for key, tmp_pathname in tmp_pathnames.items():
+            with open(tmp_pathname, "r+") as file:
+                os.fsync(file.fileno())
+            os.replace(tmp_pathname, os.path.join(blobs_dir, key))
+            self._blobs.add(key)
+
+        if len(self._pending_blobs) > 0:
+            _fsync_dir(blobs_dir)
+
+        if len(self._pending_index) > 0:
+            with open(os.path.join(self._root, INDEX_NAME), "a") as file:
+                file.write("".join("%d %s\n" % entry for entry in self._pending_index))
+                file.flush()
+                os.fsync(file.fileno())
+
+        self._pending_blobs, self._pending_index = {}, []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def generations(self):
+        """ Returns a sorted list with the generations that have a model in the store (including old "gen_<N>" files).
+        """
+        gens = set(self._index)
+        for name in (os.listdir(self._root) if os.path.isdir(self._root) else []):
+            match = _GEN_NAME.fullmatch(name)
+            if match is not None:
+                gens.add(int(match.group(1)))
+        return sorted(gens)
+
+    def hash_of(self, gen):
+        """ Returns the hash of the model of the given generation (None for old "gen_<N>" files). """
+        return self._index.get(gen)
+
+    def path(self, gen):
+        """ Returns the path to the file of the model of the given generation (pending writes are flushed first). """
+        if gen in self._index:
+            if self._index[gen] in self._pending_blobs:
+                self.flush()
+            return os.path.join(self._root, BLOBS_DIR, self._index[gen])
+
+        pathname = os.path.join(self._root, "gen_%d" % gen)
+        if not os.path.exists(pathname):
+            raise FileNotFoundError("There is no model for generation %d in \"%s\"!" % (gen, self._root))
+        return pathname
+
+    def get(self, gen, dtype=None):
+        """ Loads the model of the given generation (see NeuralNetwork.load()). """
+        from neural_network.neural_network import NeuralNetwork
+        return NeuralNetwork.load(self.path(gen), dtype=dtype)
+
+
+def read_index(root):
+    """ Reads the index of a store, returning a dictionary that maps each generation to the hash of its model. """
+    index = {}
+    pathname = os.path.join(root, INDEX_NAME)
+    if os.path.exists(pathname):
+        with open(pathname, "r") as file:
+            for line in file:
+                if line.endswith("\n"):  # ignoring an incomplete last line
+                    gen, key = line.split()
+                    index[int(gen)] = key
+    return index
+
+
+def resolve_path(pathname):
+    """ Resolves a path like "<store>/gen_<N>" to the path of the model's blob, if the file doesn't exist but the
+    directory is a store with a model for that generation. Other paths are returned unchanged. """
+    if os.path.exists(pathname):
+        return pathname
+
+    root, name = os.path.split(pathname)
+    match = _GEN_NAME.fullmatch(name)
+    if match is None:
+        return pathname
+
+    key = read_index(root).get(int(match.group(1)))
+    return os.path.join(root, BLOBS_DIR, key) if key is not None else pathname
+
+
+def _fsync_dir(pathname):
+    fd = os.open(pathname, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
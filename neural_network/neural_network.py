@@ -1,37 +1,164 @@
 """ Implements a multi-layer perceptron.
 
+Besides the usual dense layers, the network's layers can store their weights in a sparse (CSR) format, with a fixed
+connectivity mask, or quantized to 8-bit integers with one scale per layer. Sparse layers reduce the memory footprint of
+wide networks and speed up inference at low densities (below about 10%). Quantized layers are a storage format (for
+model files and the genomes of a population): their products are computed with a dequantized copy of the weights.
+The hidden layers can also be recurrent (Elman networks), keeping a hidden state between consecutive calls to
+predict().
+
 @author Gabriel Nogueira (Talendar)
 """
 
+import copy
+import hashlib
 import numpy as np
 
 
+SUPPORTED_DTYPES = ("float64", "float32", "float16")
+
+
+def compute_dtype(dtype):
+    """ Returns the data type used in the computations of a network whose parameters are stored with the given type.
+
+    Parameters stored as float16 are used in float32 computations (float16 arithmetic is slow on CPUs and numerically
+    fragile), while float32 and float64 parameters are used as they are.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.name not in SUPPORTED_DTYPES:
+        raise ValueError("Unsupported data type \"%s\"! Supported types: %s." % (dtype.name, str(SUPPORTED_DTYPES)))
+    return np.dtype(np.float32) if dtype == np.float16 else dtype
+
+
+def quantize(values, axis=None):
+    """ Quantizes values to 8-bit integers, with the scale chosen so the largest value (in absolute value) maps to 127.
+
+    :param values: array with the values to be quantized.
+    :param axis: axis along which the values share a scale. If None, all the values share a single scale.
+    :return: a tuple containing the quantized values (int8) and the scale (a float, if axis is None, or an array with
+    the reduced axis kept). The values are approximated by the quantized values times the scale.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    max_abs = np.abs(values).max(axis=axis, keepdims=axis is not None) if values.size > 0 else np.float64(0)
+    scale = np.where(max_abs > 0, max_abs / 127, 1.0)
+    q = np.clip(np.rint(values / scale), -127, 127).astype(np.int8)
+    return q, float(scale) if axis is None else scale
+
+
+def _sigmoid(z, out):
+    np.negative(z, out=out)
+    np.exp(out, out=out)
+    out += 1
+    return np.reciprocal(out, out=out)
+
+
+def _relu(z, out):
+    return np.maximum(z, 0, out=out)
+
+
+def _tanh(z, out):
+    return np.tanh(z, out=out)
+
+
+def _linear(z, out):
+    if out is not z:
+        np.copyto(out, z)
+    return out
+
+
+def _input_layer(z, out):
+    raise ValueError("Tried to activate the neurons from the input layer!")
+
+
+# Maps the name of each activation function to its implementation. Each implementation writes its result to "out",
+# which may be the same array as "z".
+ACTIVATION_FUNCTIONS = {
+    "sigmoid": _sigmoid,
+    "relu": _relu,
+    "tanh": _tanh,
+    "linear": _linear,
+    "input_layer": _input_layer,
+}
+
+
 class NeuralNetwork:
     """ Basic implementation of a multi-layer perceptron, the standard feedforward neural network. """
 
-    def __init__(self, layers_size=None, layers_activation="sigmoid", weights_multiplier=1):
+    def __init__(self, layers_size=None, layers_activation="sigmoid", weights_multiplier=1, dtype=np.float64,
+                 weights_format="dense", density=1.0, mask_seed=0, recurrent=False):
         """ Constructor.
 
         :param layers_size: list containing the sizes of the layers. The layers activation functions will be the default one.
+        :param dtype: data type in which the network's weights and bias are stored ("float64", "float32" or "float16").
+        :param weights_format: how the weights of the layers are stored: "dense", "csr" (sparse) or "int8" (quantized).
+        :param density: fraction of the connections kept in each "csr" layer.
+        :param mask_seed: seed of the connectivity masks of the "csr" layers. Networks created with the same seed (and
+        format) have the same connections, so their genomes are compatible.
+        :param recurrent: whether the hidden layers are recurrent (see RecurrentLayer). Only supported by "dense" networks.
         """
+        self.dtype = np.dtype(dtype)
         self.layers = []
+        self._input, self._plan = None, None
         if layers_size is not None:
-            self.layers.append(NeuralLayer(layers_size[0], input_count=0, activation="input_layer"))
-            for s in layers_size[1:]:
+            self.layers.append(NeuralLayer(layers_size[0], input_count=0, activation="input_layer", dtype=dtype))
+            for i, s in enumerate(layers_size[1:]):
                 input_count = self.layers[-1].size
-                self.layers.append(NeuralLayer(s, input_count, layers_activation, weights_multiplier=weights_multiplier))
+                self.layers.append(make_layer(s, input_count, layers_activation, weights_multiplier=weights_multiplier,
+                                              dtype=dtype, weights_format=weights_format, density=density,
+                                              mask_seed=mask_seed + i,
+                                              recurrent=recurrent and i < len(layers_size) - 2))
+            self._compile()
+
+    def __getstate__(self):
+        # the buffers are rebuilt on demand, so they aren't pickled (keeps the networks sent to other processes small)
+        state = self.__dict__.copy()
+        state["_input"], state["_plan"] = None, None
+        return state
+
+    def _compile(self):
+        """ Builds the network's execution plan: the input buffer and, for each layer, the buffer its output is written
+        to. The outputs alternate between two preallocated (ping-pong) buffers, large enough for the widest layer. """
+        dtype = compute_dtype(self.dtype)
+        width = max(l.size for l in self.layers[1:])
+        ping_pong = np.empty(width, dtype=dtype), np.empty(width, dtype=dtype)
+
+        self._input = np.empty((self.layers[0].size, 1), dtype=dtype)
+        self._plan = [(l, ping_pong[i % 2][:l.size].reshape(l.size, 1)) for i, l in enumerate(self.layers[1:])]
 
     def predict(self, x):
-        """ Wrapper for the feedforward function that uses the network's current weights and bias.
+        """ Feeds a single sample to the network, using its current weights and bias.
 
-        :param x: column vector containing the features of the sample. If an out of shape numpy array is fed, this function
-        won't work properly due to errors in matrix multiplications.
-        :return:
+        The computations are made in the buffers of the network's execution plan, so dense and quantized networks don't
+        allocate new arrays (sparse layers need a temporary array with the products of their connections).
+
+        :param x: vector containing the features of the sample.
+        :return: column vector with the output of each neuron of the output layer. The returned array is one of the
+        network's internal buffers and will be overwritten by the next call to this method, so copy it if needed.
         """
-        weights = [l.weights for l in self.layers[1:]]
-        bias = [l.bias for l in self.layers[1:]]
+        if self._plan is None:
+            self._compile()
 
-        return self.feedforward(weights, bias, x)
+        a = self._input
+        a[:, 0] = x
+        for l, out in self._plan:
+            a = l.step(a, out)
+
+        return a
+
+    def predict_batch(self, x):
+        """ Feeds a batch of samples to the network at once.
+
+        In recurrent networks, each row is treated as the current step of a different sequence (e.g. of a different
+        game): the hidden state of each row is kept until the next call with a batch of the same size.
+
+        :param x: matrix with one sample per row (shape: [num_samples, num_features]).
+        :return: matrix with the output of the network for each sample, one per row (shape: [num_samples, num_outputs]).
+        """
+        a = np.asarray(x, dtype=compute_dtype(self.dtype)).T
+        for l in self.layers[1:]:
+            a = l.step(a, np.empty((l.size, a.shape[1]), dtype=a.dtype))
+
+        return a.T
 
     def feedforward(self, weights, bias, x):
         """ Feeds the data to the network.
@@ -49,19 +176,130 @@ class NeuralNetwork:
 
         return a
 
-    @staticmethod
-    def colvector(v):
-        """ Turns a numpy array into a column vector. """
-        v2 = v.copy()
+    def colvector(self, v):
+        """ Turns a numpy array into a column vector (with the network's computation data type). """
+        v2 = np.array(v, dtype=compute_dtype(self.dtype))
         v2.shape = (len(v), 1)
         return v2
 
+    def reset(self):
+        """ Clears the hidden state of the network's recurrent layers (e.g. before a new game). """
+        for l in self.layers[1:]:
+            l.reset()
+
+    @property
+    def recurrent(self):
+        """ Whether the network has recurrent layers. """
+        return any(l.layer_type == "recurrent" for l in self.layers[1:])
+
+    @property
+    def weights_format(self):
+        """ Format in which the weights of the network's layers are stored ("dense", "csr" or "int8"). """
+        return self.layers[-1].weights_format
+
     def get_weights(self):
         return [layer.weights.copy() for layer in self.layers[1:]]
 
     def set_weights(self, weights):
         for i, layer in enumerate(self.layers[1:]):
-            layer.weights = weights[i].copy()
+            layer.set_weights(weights[i])
+
+    def get_bias(self):
+        return [layer.bias.copy() for layer in self.layers[1:]]
+
+    def set_bias(self, bias):
+        for i, layer in enumerate(self.layers[1:]):
+            layer.bias[...] = np.reshape(bias[i], layer.bias.shape)
+
+    def genome_size(self):
+        """ Returns the number of parameters (weights and bias) of the network. """
+        return sum(l.genome_size() for l in self.layers[1:])
+
+    def genome_segments(self):
+        """ Returns a list with the sizes of the consecutive segments of the network's genome (see get_genome()): the
+        weights (and recurrent weights) and the bias of each layer. """
+        return [size for l in self.layers[1:] for size in l.genome_segments()]
+
+    def get_genome(self):
+        """ Returns a flat vector with a copy of the network's parameters: the weights and the bias of each layer, in
+        order. Only the existing connections of sparse layers are included. """
+        return np.concatenate([l.get_genome() for l in self.layers[1:]])
+
+    def set_genome(self, genome):
+        """ Sets the network's parameters from a flat vector (in the format returned by get_genome()).
+
+        The values are copied into the layers' current arrays, so the network's execution plan stays valid.
+        """
+        if len(genome) != self.genome_size():
+            raise ValueError("The genome has %d parameters, but the network has %d!" % (len(genome), self.genome_size()))
+
+        i = 0
+        for l in self.layers[1:]:
+            l.set_genome(genome[i:i + l.genome_size()])
+            i += l.genome_size()
+
+    def content_hash(self):
+        """ Returns a hash (hex string) of the network's architecture and parameters. Networks with the same hash are
+        identical. """
+        h = hashlib.sha1()
+        for l in self.layers:
+            h.update(("%s %s %d %d %s %s;" % (l.weights_format, l.layer_type, l.size, l.input_count, l.activation,
+                                              l.dtype.name)).encode())
+            if l.bias is not None:
+                h.update(l.get_genome().tobytes())
+            if l.weights_format == "csr":
+                h.update(l.indices.tobytes())
+                h.update(l.indptr.tobytes())
+        return h.hexdigest()
+
+    def astype(self, dtype):
+        """ Returns a copy of this network whose weights and bias are stored with the given data type. """
+        net = NeuralNetwork(dtype=dtype)
+        net.layers = [layer.astype(dtype) for layer in self.layers]
+        return net
+
+    def pruned(self, density):
+        """ Returns a sparse ("csr") copy of this network, keeping only the largest (in absolute value) weights of
+        each layer.
+
+        :param density: fraction of the weights of each layer to be kept.
+        :return: the pruned network.
+        """
+        if self.recurrent:
+            raise ValueError("Recurrent networks can't be pruned!")
+
+        net = NeuralNetwork(dtype=self.dtype)
+        net.layers.append(self.layers[0].astype(self.dtype))
+        for layer in self.layers[1:]:
+            weights = layer.weights
+            keep = int(np.ceil(density * weights.size))
+            mask = np.zeros(weights.size, dtype=bool)
+            if keep > 0:
+                mask[np.argpartition(-np.abs(weights).ravel(), keep - 1)[:keep]] = True
+
+            new_layer = SparseLayer(layer.size, layer.input_count, layer.activation, layer.weights_multiplier,
+                                    dtype=self.dtype)
+            new_layer.connect(*np.nonzero(mask.reshape(weights.shape)), weights=weights)
+            new_layer.bias = layer.bias.copy()
+            net.layers.append(new_layer)
+
+        return net
+
+    def quantized(self):
+        """ Returns a copy of this network with the weights of each layer quantized to 8-bit integers ("int8"). """
+        if self.recurrent:
+            raise ValueError("Recurrent networks can't be quantized!")
+
+        net = NeuralNetwork(dtype=self.dtype)
+        net.layers.append(self.layers[0].astype(self.dtype))
+        for layer in self.layers[1:]:
+            new_layer = QuantizedLayer(layer.size, layer.input_count, layer.activation, layer.weights_multiplier,
+                                       dtype=self.dtype)
+            new_layer.weights = layer.weights
+            new_layer.bias = layer.bias.copy()
+            net.layers.append(new_layer)
+
+        return net
 
     def save(self, out_pathname):
         with open(out_pathname, "w") as file:
@@ -70,12 +308,14 @@ class NeuralNetwork:
                     "LAYER_ACTIVATION %s\n" % layer.activation +
                     "SIZE %d\n" % layer.size +
                     "INPUT_COUNT %d\n" % layer.input_count +
-                    "WEIGHTS_MULTIPLIER %.2f\n" % layer.weights_multiplier
+                    "WEIGHTS_MULTIPLIER %.2f\n" % layer.weights_multiplier +
+                    ("DTYPE %s\n" % layer.dtype.name if layer.dtype != np.float64 else "") +
+                    layer.header()
                 )
 
                 if layer.activation != "input_layer":
                     to_write = ""
-                    for row in layer.weights:
+                    for row in layer.stored_weights():
                         for item in row:
                             to_write += str(item) + " "
                         to_write += "\n"
@@ -89,9 +329,18 @@ class NeuralNetwork:
                     file.write("\n")
 
     @staticmethod
-    def load(in_pathname):
-        with open(in_pathname, "r") as file:
-            net = NeuralNetwork()
+    def load(in_pathname, dtype=None):
+        """ Loads a neural network from a file.
+
+        :param in_pathname: path to the file. Paths like "best_models/gen_<N>" are also resolved through the index of
+        a model store (see neural_network/model_store.py).
+        :param dtype: data type in which the loaded weights will be stored. If None, the type saved in the file is used
+        (float64 for files that don't specify one).
+        :return: the loaded network.
+        """
+        from neural_network.model_store import resolve_path
+        with open(resolve_path(in_pathname), "r") as file:
+            layers = []
 
             line = file.readline()
             while line != "":
@@ -100,55 +349,423 @@ class NeuralNetwork:
                 input_count = int(file.readline().replace("\n", "").split(" ")[1])
                 weights_multiplier = float(file.readline().replace("\n", "").split(" ")[1])
 
-                layer = NeuralLayer(size, input_count, activation, weights_multiplier)
-
-                weights = []
+                # optional header entries
+                header = {}
                 line = file.readline()
+                while line.split(" ")[0].isupper():
+                    key, value = line.replace("\n", "").split(" ")[:2]
+                    header[key] = value
+                    line = file.readline()
+
+                layer_dtype = dtype if dtype is not None else np.dtype(header.get("DTYPE", "float64"))
+                layer_type = LAYER_TYPES[header.get("WEIGHTS_FORMAT", "dense")]
+                if header.get("LAYER_TYPE") == "recurrent":
+                    layer_type = RecurrentLayer
+                if activation == "input_layer":
+                    layer_type = NeuralLayer
+                layer = layer_type(size, input_count, activation, weights_multiplier, dtype=layer_dtype)
 
+                weights = []
                 while line != "\n" and line != "":
                     weights.append(line.replace("\n", "").split(" ")[:-1])
                     line = file.readline()
 
                 if len(weights) > 0:
-                    for i in range(len(weights) - 1):
-                        for j in range(len(weights[i])):
-                            layer.weights[i][j] = float(weights[i][j])
+                    layer.load_weights(weights[:-1], header)
+                    layer.bias[:, 0] = np.array(weights[-1], dtype=np.float64)
 
-                    for i, b in enumerate(weights[-1]):
-                        layer.bias[i][0] = float(b)
-
-                net.layers.append(layer)
+                layers.append(layer)
                 line = file.readline()
 
+            net = NeuralNetwork(dtype=dtype if dtype is not None else layers[-1].dtype)
+            net.layers = layers
             return net
 
 
 class NeuralLayer:
-    """ Represents a feedforward layer in a neural network. """
+    """ Represents a feedforward layer in a neural network, with a dense matrix of weights. """
+
+    weights_format = "dense"
+    layer_type = "feedforward"
 
-    def __init__(self, size, input_count, activation="sigmoid", weights_multiplier=1.0):
+    def __init__(self, size, input_count, activation="sigmoid", weights_multiplier=1.0, dtype=np.float64):
         self.size = size
         self.input_count = input_count
         self.activation = activation
         self.weights_multiplier = weights_multiplier
+        self.dtype = np.dtype(dtype)
+        compute_dtype(self.dtype)  # validating the data type
 
-        if activation.lower() == "input_layer":
+        if self.activation == "input_layer":
             self.weights, self.bias = None, None
         else:
-            self.weights = np.random.uniform(low=-1, high=1, size=(size, input_count)) * self.weights_multiplier
-            self.bias = np.random.uniform(low=-1, high=1, size=(size, 1)) * self.weights_multiplier
+            self.weights = (np.random.uniform(low=-1, high=1, size=(size, input_count))
+                            * self.weights_multiplier).astype(self.dtype)
+            self.bias = (np.random.uniform(low=-1, high=1, size=(size, 1)) * self.weights_multiplier).astype(self.dtype)
+
+    @property
+    def activation(self):
+        """ Name of the layer's activation function. """
+        return self._activation
+
+    @activation.setter
+    def activation(self, name):
+        """ Sets the layer's activation function, resolving its implementation once (instead of on every call). """
+        if name.lower() not in ACTIVATION_FUNCTIONS:
+            raise NameError("Activation function of type \"%s\" is not defined!" % str(name))
+
+        self._activation = name.lower()
+        self.activation_function = ACTIVATION_FUNCTIONS[self._activation]
 
     def activate(self, z):
-        if self.activation.lower() == "input_layer":
-            raise ValueError("Tried to activate the neurons from the input layer!")
+        return self.activation_function(z, np.empty_like(z))
+
+    def forward(self, a, out):
+        """ Computes the weighted inputs of the layer's neurons (before the activation) for the input matrix "a" (one
+        sample per column), writing them to "out". """
+        np.dot(self.weights, a, out=out)
+        out += self.bias
+        return out
+
+    def step(self, a, out):
+        """ Computes the activations of the layer's neurons for the input matrix "a" (one sample per column), writing
+        them to "out". """
+        return self.activation_function(self.forward(a, out), out)
+
+    def reset(self):
+        """ Clears the layer's state (only recurrent layers have one). """
+        pass
+
+    def set_weights(self, weights):
+        """ Sets the layer's weights from a dense matrix. """
+        self.weights = np.array(weights, dtype=self.dtype)
+
+    def genome_size(self):
+        return self.weights.size + self.bias.size
+
+    def genome_segments(self):
+        return [self.genome_size() - self.bias.size, self.bias.size]
+
+    def get_genome(self):
+        return np.concatenate([self.weights.ravel(), self.bias.ravel()])
+
+    def set_genome(self, genome):
+        self.weights[...] = genome[:self.weights.size].reshape(self.weights.shape)
+        self.bias[...] = genome[self.weights.size:].reshape(self.bias.shape)
+
+    def astype(self, dtype):
+        """ Returns a copy of this layer whose parameters are stored with the given data type. """
+        layer = copy.copy(self)
+        layer.dtype = np.dtype(dtype)
+        compute_dtype(layer.dtype)
+        if self.bias is not None:
+            layer._cast_parameters(layer.dtype)
+        return layer
+
+    def _cast_parameters(self, dtype):
+        self.weights = self.weights.astype(dtype)
+        self.bias = self.bias.astype(dtype)
+
+    def header(self):
+        """ Returns the format-specific header entries written when the layer is saved. """
+        return ""
+
+    def stored_weights(self):
+        """ Returns the rows of weights written when the layer is saved. """
+        return self.weights
+
+    def load_weights(self, rows, header):
+        """ Sets the layer's weights from the rows read from a file (strings, in the format of stored_weights()).
+
+        :param rows: the rows of weights (lists of strings).
+        :param header: dictionary with the layer's header entries.
+        """
+        self.weights = np.array(rows, dtype=np.float64).astype(self.dtype)
+
+
+class SparseLayer(NeuralLayer):
+    """ Feedforward layer whose weights are stored in the compressed sparse row (CSR) format.
+
+    Only the existing connections have weights (and genes): the values of their weights are kept in "data", in
+    row-major order, along with the index of their inputs ("indices") and the position where the values of each row
+    start ("indptr"). The connectivity mask is drawn once, when the layer is created, and kept by mutations, by
+    set_genome() and by save() and load() (a connection whose weight happens to be 0 still exists), so the genomes of
+    layers created with the same mask seed are compatible.
+    """
+
+    weights_format = "csr"
+
+    def __init__(self, size, input_count, activation="sigmoid", weights_multiplier=1.0, dtype=np.float64,
+                 density=1.0, mask_seed=None):
+        super().__init__(size, input_count, activation, weights_multiplier, dtype)
+        if density < 1:
+            mask = np.random.default_rng(mask_seed).random((size, input_count)) < density
+            self.connect(*np.nonzero(mask), weights=self.weights)
+
+    @property
+    def weights(self):
+        """ Dense copy of the layer's weights matrix (a new array). Setting it redefines the layer's connections as
+        the non-zero entries of the given matrix (see connect() to keep connections with null weights). """
+        dense = np.zeros((self.size, self.input_count), dtype=self.dtype)
+        dense[self.row_ids, self.indices] = self.data
+        return dense
+
+    @weights.setter
+    def weights(self, weights):
+        weights = np.asarray(weights)
+        self.connect(*np.nonzero(weights), weights=weights)
+
+    def connect(self, row_ids, indices, weights):
+        """ Redefines the layer's connections.
+
+        :param row_ids: vector with the index of the neuron (row) of each connection, in ascending order.
+        :param indices: vector with the index of the input (column) of each connection.
+        :param weights: dense matrix from which the weights of the connections are taken.
+        """
+        self.row_ids, self.indices = np.asarray(row_ids, dtype=np.intp), np.asarray(indices, dtype=np.intp)
+        self.data = np.asarray(weights)[self.row_ids, self.indices].astype(self.dtype)
+
+        row_counts = np.bincount(self.row_ids, minlength=self.size)
+        self.indptr = np.concatenate([[0], np.cumsum(row_counts)])
+        self._nonempty = row_counts > 0
+        self._row_starts = self.indptr[:-1][self._nonempty]
+
+    @property
+    def density(self):
+        """ Fraction of the possible connections that exist in the layer. """
+        return len(self.data) / (self.size * self.input_count)
+
+    def forward(self, a, out):
+        """ Gathers the inputs of the connections, multiplies them by the weights and sums the products of each row
+        (with np.add.reduceat()). A single sample (column) is gathered as a vector, which is much faster than gathering
+        the rows of a matrix. """
+        if len(self.data) == 0:
+            out[...] = 0
+        else:
+            if a.shape[1] == 1:
+                products = a[:, 0][self.indices]
+                products *= self.data
+            else:
+                products = a[self.indices]
+                products *= self.data[:, None]
+
+            if self._nonempty.all():
+                np.add.reduceat(products, self._row_starts, axis=0, out=out if a.shape[1] > 1 else out[:, 0])
+            else:
+                out[...] = 0
+                out[self._nonempty] = np.add.reduceat(products, self._row_starts, axis=0).reshape(-1, a.shape[1])
+
+        out += self.bias
+        return out
+
+    def set_weights(self, weights):
+        """ Sets the weights of the layer's existing connections from a dense matrix (the other entries are ignored). """
+        self.data[...] = np.asarray(weights)[self.row_ids, self.indices]
+
+    def genome_size(self):
+        return self.data.size + self.bias.size
+
+    def get_genome(self):
+        return np.concatenate([self.data, self.bias.ravel()])
+
+    def set_genome(self, genome):
+        self.data[...] = genome[:self.data.size]
+        self.bias[...] = genome[self.data.size:].reshape(self.bias.shape)
+
+    def _cast_parameters(self, dtype):
+        self.data = self.data.astype(dtype)
+        self.bias = self.bias.astype(dtype)
+
+    def stored_weights(self):
+        return self.weights
+
+    def load_weights(self, rows, header):
+        weights = np.array(rows, dtype=np.float64)
+        if "INDPTR" not in header:  # older files: the connections are the non-zero weights
+            self.weights = weights
+            return
+
+        indptr = np.array(header["INDPTR"].split(","), dtype=np.intp)
+        indices = np.array([i for i in header["INDICES"].split(",") if i != ""], dtype=np.intp)
+        self.connect(np.repeat(np.arange(self.size), np.diff(indptr)), indices, weights)
+
+    def header(self):
+        return "WEIGHTS_FORMAT csr\nINDPTR %s\nINDICES %s\n" % (",".join(map(str, self.indptr)),
+                                                                 ",".join(map(str, self.indices)))
+
+
+class QuantizedLayer(NeuralLayer):
+    """ Feedforward layer whose weights are quantized to 8-bit integers ("q"), with a single scale for the whole layer.
+
+    The weights are approximated by q * scale, with the scale chosen so the largest weight (in absolute value) maps to
+    127. The bias is kept with the layer's data type. The layer's genes are the dequantized weights, so the usual
+    mutation operators work on them; the weights are quantized again whenever they are set.
+
+    The int8 format is a storage format: the products are computed (with BLAS) by a dequantized copy of the weights in
+    the layer's computation data type, built on the first call to forward() after the weights are set. Multiplying the
+    int8 matrix directly would upcast it on every call, which is about twice as slow as a dense layer.
+    """
+
+    weights_format = "int8"
+
+    def __getstate__(self):
+        # the dequantized copy of the weights is rebuilt on demand, so it isn't pickled
+        state = self.__dict__.copy()
+        state["_matrix"] = None
+        return state
+
+    @property
+    def weights(self):
+        """ Dequantized copy of the layer's weights matrix (a new array). Setting it quantizes the given matrix. """
+        return (self.q * self.scale).astype(self.dtype)
+
+    @weights.setter
+    def weights(self, weights):
+        self.q, self.scale = quantize(weights)
+        self._matrix = None
+
+    def forward(self, a, out):
+        if self._matrix is None:
+            self._matrix = (self.q * self.scale).astype(compute_dtype(self.dtype))
+
+        np.dot(self._matrix, a, out=out)
+        out += self.bias
+        return out
+
+    def genome_size(self):
+        return self.q.size + self.bias.size
 
-        if self.activation.lower() == "sigmoid":
-            return 1 / (1 + np.exp(-z))
+    def get_genome(self):
+        return np.concatenate([self.weights.ravel(), self.bias.ravel()])
 
-        if self.activation.lower() == "relu":
-            return np.maximum(z, 0)
+    def set_genome(self, genome):
+        self.weights = genome[:self.q.size].reshape(self.q.shape)
+        self.bias[...] = genome[self.q.size:].reshape(self.bias.shape)
 
-        if self.activation.lower() == "linear":
-            return z
+    def _cast_parameters(self, dtype):
+        self.bias = self.bias.astype(dtype)
+        self._matrix = None
 
-        raise NameError("Activation function of type \"%s\" is not defined!" % str(self.activation))
+    def stored_weights(self):
+        return self.q
+
+    def load_weights(self, rows, header):
+        self.weights = np.array(rows, dtype=np.float64) * float(header["SCALE"])
+
+    def header(self):
+        return "WEIGHTS_FORMAT int8\nSCALE %r\n" % self.scale
+
+
+class RecurrentLayer(NeuralLayer):
+    """ Recurrent (Elman) layer: the weighted inputs of its neurons also depend on the layer's own activations in the
+    previous step, through a matrix of recurrent weights.
+
+    The hidden state is kept in preallocated buffers, one column per sequence being stepped (a single one for predict()
+    and one per sample for predict_batch()), and must be cleared with reset() before a new sequence (game) starts. The
+    genes of the layer are its input weights, its recurrent weights and its bias.
+
+    The state is fed back on every step, so it must be bounded: with an unbounded activation (like ReLU), it grows until
+    it overflows in long games. Recurrent layers are created with tanh (see make_layer()) and their recurrent weights are
+    initialized in [-1/sqrt(size), 1/sqrt(size)] (times the weights multiplier).
+    """
+
+    layer_type = "recurrent"
+
+    def __init__(self, size, input_count, activation="tanh", weights_multiplier=1.0, dtype=np.float64):
+        super().__init__(size, input_count, activation, weights_multiplier, dtype)
+        self.recurrent_weights = (np.random.uniform(low=-1, high=1, size=(size, size)) / np.sqrt(size)
+                                  * self.weights_multiplier).astype(self.dtype)
+        self.state, self._recurrent_input = None, None
+
+    def reset(self, batch_size=None):
+        """ Clears the hidden state. If a batch size is given, the state buffers are resized to hold that many
+        sequences. """
+        if batch_size is None:
+            if self.state is not None:
+                self.state[...] = 0
+                return
+            batch_size = 1
+
+        dtype = compute_dtype(self.dtype)
+        self.state = np.zeros((self.size, batch_size), dtype=dtype)
+        self._recurrent_input = np.empty((self.size, batch_size), dtype=dtype)
+
+    def step(self, a, out):
+        if self.state is None or self.state.shape[1] != a.shape[1]:
+            self.reset(a.shape[1])
+
+        self.forward(a, out)
+        np.dot(self.recurrent_weights, self.state, out=self._recurrent_input)
+        out += self._recurrent_input
+        self.activation_function(out, out)
+        self.state[...] = out
+        return out
+
+    def genome_size(self):
+        return self.weights.size + self.recurrent_weights.size + self.bias.size
+
+    def get_genome(self):
+        return np.concatenate([self.weights.ravel(), self.recurrent_weights.ravel(), self.bias.ravel()])
+
+    def set_genome(self, genome):
+        i, j = self.weights.size, self.weights.size + self.recurrent_weights.size
+        self.weights[...] = genome[:i].reshape(self.weights.shape)
+        self.recurrent_weights[...] = genome[i:j].reshape(self.recurrent_weights.shape)
+        self.bias[...] = genome[j:].reshape(self.bias.shape)
+
+    def _cast_parameters(self, dtype):
+        super()._cast_parameters(dtype)
+        self.recurrent_weights = self.recurrent_weights.astype(dtype)
+        self.state, self._recurrent_input = None, None
+
+    def stored_weights(self):
+        return list(self.weights) + list(self.recurrent_weights)
+
+    def load_weights(self, rows, header):
+        self.weights = np.array(rows[:self.size], dtype=np.float64).astype(self.dtype)
+        self.recurrent_weights = np.array(rows[self.size:], dtype=np.float64).astype(self.dtype)
+
+    def header(self):
+        return "LAYER_TYPE recurrent\n"
+
+
+# Maps the name of each weights format to the layer class implementing it.
+LAYER_TYPES = {
+    "dense": NeuralLayer,
+    "csr": SparseLayer,
+    "int8": QuantizedLayer,
+}
+
+
+def make_layer(size, input_count, activation="sigmoid", weights_multiplier=1.0, dtype=np.float64,
+               weights_format="dense", density=1.0, mask_seed=None, recurrent=False):
+    """ Creates a new layer whose weights are stored in the given format ("dense", "csr" or "int8"). The density and
+    the mask seed are only used by "csr" layers. Recurrent layers must be "dense" and always use the tanh activation
+    (which keeps their state bounded), whatever the given one. """
+    if recurrent:
+        if weights_format != "dense":
+            raise ValueError("Recurrent layers only support the \"dense\" weights format!")
+        return RecurrentLayer(size, input_count, "tanh", weights_multiplier, dtype)
+    if weights_format not in LAYER_TYPES:
+        raise ValueError("Unknown weights format \"%s\"! Supported formats: %s." % (weights_format,
+                                                                                    str(tuple(LAYER_TYPES))))
+    if weights_format == "csr":
+        return SparseLayer(size, input_count, activation, weights_multiplier, dtype, density=density,
+                           mask_seed=mask_seed)
+    return LAYER_TYPES[weights_format](size, input_count, activation, weights_multiplier, dtype)
+
+
+def action_divergence(net, samples, dtype):
+    """ Measures how often a reduced-precision copy of a network chooses a different action than its float64 version.
+
+    :param net: the neural network.
+    :param samples: matrix with one sample (set of features) per row.
+    :param dtype: the reduced-precision data type to be validated (e.g. "float32" or "float16").
+    :return: the fraction (between 0 and 1) of samples in which the index of the highest output differs.
+    """
+    if len(samples) == 0:
+        return 0.0
+
+    reference = net.astype(np.float64).predict_batch(samples)
+    reduced = net.astype(dtype).predict_batch(samples)
+    return float(np.mean(np.argmax(reference, axis=1) != np.argmax(reduced, axis=1)))
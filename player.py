@@ -5,7 +5,6 @@
 
 from abc import ABC, abstractmethod
 from game_logic_handler import Action
-import pygame
 
 
 class Player(ABC):
@@ -16,6 +15,10 @@ class Player(ABC):
         """ Returns the action taken by the player. """
         pass
 
+    def handle_events(self, user_events):
+        """ Handles the user's input as soon as it arrives, between the game's steps. Does nothing by default. """
+        pass
+
 
 class HumanPlayer(Player):
     """ Defines a human player. """
@@ -23,22 +26,27 @@ class HumanPlayer(Player):
     def __init__(self):
         """ """
         self._current_action = Action.LEFT
+        self._next_action = Action.LEFT  # chosen by the keys pressed since the last step
         self.score = 0
 
-    def act(self, handler=None, user_events=None):
-        """ Returns the action taken by the human player. """
-        events = user_events if user_events is not None else pygame.event.get()
-        new_action = self._current_action
-        for event in events:
+    def handle_events(self, user_events):
+        """ Updates the action taken in the next step with the keys pressed by the user. """
+        import pygame  # imported lazily, so that AI-only code paths don't depend on pygame
+        for event in user_events:
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_LEFT and self._current_action != Action.RIGHT:
-                    new_action = Action.LEFT
+                    self._next_action = Action.LEFT
                 elif event.key == pygame.K_RIGHT and self._current_action != Action.LEFT:
-                    new_action = Action.RIGHT
+                    self._next_action = Action.RIGHT
                 elif event.key == pygame.K_UP and self._current_action != Action.DOWN:
-                    new_action = Action.UP
+                    self._next_action = Action.UP
                 elif event.key == pygame.K_DOWN and self._current_action != Action.UP:
-                    new_action = Action.DOWN
+                    self._next_action = Action.DOWN
 
-        self._current_action = new_action
-        return new_action
+    def act(self, handler=None, user_events=None):
+        """ Returns the action taken by the human player. Events not yet passed to handle_events() can be given in
+        user_events (if None, pygame's event queue is read). """
+        import pygame
+        self.handle_events(user_events if user_events is not None else pygame.event.get())
+        self._current_action = self._next_action
+        return self._current_action
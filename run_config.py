@@ -0,0 +1,133 @@
+""" Immutable configuration of a game / evolution run.
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+from dataclasses import dataclass, fields, replace, astuple
+import hashlib
+from evolution.features import encoder_class
+import config
+
+
+@dataclass(frozen=True)
+class RunConfig:
+    """ Immutable (and hashable) set of settings used by the game's logic, the AI players and the genetic algorithm.
+
+    Instances are passed explicitly to GameLogicHandler, SnakeAI, SnakePopulation and create_brain, so runs with
+    different settings can share a process (or a pool of workers). Use RunConfig.from_config() to create an instance
+    with the values currently in config.py. The board entities, the colors and the other GUI settings aren't part of
+    the run's configuration and are still read from config.py.
+    """
+    board_size: tuple
+    initial_snake_size: int
+    food_spawn_min_dist: int
+    food_score: int
+
+    max_turns: int
+    plays_per_gen: int
+    use_food_list: bool
+    food_pos_list: tuple
+
+    life_saving: bool
+    life_saving_penalty: int
+    life_saving_cooldown: int
+    max_no_food_turns: int
+    curriculum: tuple
+
+    episode_time_budget: object  # float or None
+    generation_time_budget: object  # float or None
+    generation_turn_budget: object  # int or None
+    budget_check_turns: int
+
+    optimizer: str
+    optimizer_sigma: float
+    es_learning_rate: float
+
+    min_mutation_rate: float
+    max_mutation_rate: float
+
+    weights_mult_factor: float
+    brain_format: tuple
+    brain_dtype: str
+    brain_weights_format: str
+    brain_density: float
+    recurrent_brain: bool
+
+    random_kill_pc: float
+    mass_extinction_threshold: int
+
+    novelty_weight: float
+    novelty_k: int
+    novelty_grid: int
+    novelty_archive_prob: float
+    novelty_archive_size: int
+
+    closer_to_food_score: int
+    farther_from_food_score: int
+
+    feature_encoder: str
+    sight_radius: int
+
+    metrics_flush_generations: int
+    memory_profiling: bool
+    memory_top_sites: int
+
+    seed: object  # int or None
+
+    @staticmethod
+    def from_config(overrides=None, **kwargs):
+        """ Creates a new RunConfig with the values currently set in config.py.
+
+        :param overrides: optional dictionary mapping the names of settings of config.py (e.g. "SIGHT_RADIUS") to the
+        values that should be used instead of the ones in config.py.
+        :param kwargs: fields of the RunConfig (e.g. sight_radius=2) whose values should be overwritten.
+        :return: a new RunConfig.
+        """
+        values = {f.name: getattr(config, f.name.upper()) for f in fields(RunConfig)}
+        if overrides is not None:
+            for key, value in overrides.items():
+                if key.lower() not in values:
+                    raise ValueError("Unknown setting \"%s\"!" % key)
+                values[key.lower()] = value
+
+        values.update(kwargs)
+        return RunConfig(**RunConfig._hashable(values))
+
+    @staticmethod
+    def field_names():
+        """ Returns the names of the settings covered by a RunConfig, as they appear in config.py. """
+        return [f.name.upper() for f in fields(RunConfig)]
+
+    @staticmethod
+    def _hashable(values):
+        """ Converts the lists in the given values to tuples, so the resulting RunConfig is hashable. """
+        values = dict(values)
+        values["board_size"] = tuple(values["board_size"])
+        values["brain_format"] = tuple(values["brain_format"])
+        values["food_pos_list"] = tuple(tuple(p) for p in values["food_pos_list"])
+        values["curriculum"] = tuple(
+            tuple(sorted((k, tuple(v) if isinstance(v, (list, tuple)) else v) for k, v in dict(stage).items()))
+            for stage in values["curriculum"]
+        )
+        return values
+
+    def replace(self, **kwargs):
+        """ Returns a copy of this RunConfig with the given fields replaced. """
+        return replace(self, **RunConfig._hashable({**self.__dict__, **kwargs}))
+
+    @property
+    def num_cells(self):
+        """ Number of cells of the board seen by the AI around the snake's head. """
+        return (2*self.sight_radius + 1)**2
+
+    @property
+    def num_features(self):
+        """ Number of input features of the AI's neural network (defined by the feature encoder). """
+        return encoder_class(self.feature_encoder).feature_count(self)
+
+    def fingerprint(self):
+        """ Returns a short string that uniquely identifies the values of this configuration.
+
+        Unlike hash(), the fingerprint is stable across processes and executions of the program.
+        """
+        return hashlib.sha1(repr(astuple(self)).encode()).hexdigest()[:16]
@@ -3,9 +3,8 @@
 @author Gabriel Nogueira (Talendar)
 """
 
-from game_logic_handler import *
+from game_logic_handler import GameLogicHandler, Action
 from game_screen import GameScreen
-from pygame.time import Clock
 import pygame
 import config
 
@@ -20,48 +19,71 @@ class SnakeGame:
         self._screen.draw(self._logic_handler.board, 0, 1, config.FPS, " -", True, Action.LEFT)
 
     def start(self, gen=" -", bonus_points=False):
+        """ Plays the game until the snake dies.
+
+        The simulation is stepped at a fixed rate (config.FPS). Between the steps, the loop sleeps in pygame.event.wait(),
+        waking up as soon as the user's input arrives, which is handed to the player right away (see
+        Player.handle_events()) instead of once per step.
+        """
         alive = True
-        clock = Clock()
         turn = 1
 
         self._screen.draw(self._logic_handler.board, self._player.score, turn, config.FPS, gen, alive, Action.LEFT, start_msg=True)
-        ask_start = True
-        while ask_start:
-            for event in pygame.event.get():
-                if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
-                    ask_start = False
-                    break
-                elif event.type == pygame.QUIT:
-                    pygame.quit()
-                    exit()
+        self._wait_for_start()
 
+        run_config = self._logic_handler.run_config
         last_food_dist = self._logic_handler.abs_food_dist()
+        step_ms = 1000 / config.FPS
+        next_step = pygame.time.get_ticks() + step_ms
         while alive:
-            events = pygame.event.get()
-            for e in events:
-                if e.type == pygame.QUIT:
-                    pygame.quit()
-                    exit()
+            # waiting for the next step, handling the user's input as it arrives
+            now = pygame.time.get_ticks()
+            while now < next_step:
+                self._handle_events(pygame.event.wait(max(1, int(next_step - now))))
+                now = pygame.time.get_ticks()
+            next_step = max(next_step + step_ms, now)  # after a stall, the game isn't sped up to catch up
 
-            move = self._player.act(handler=self._logic_handler, user_events=events)
+            move = self._player.act(handler=self._logic_handler, user_events=[])
             state = self._logic_handler.update(move)
             alive = (state != GameLogicHandler.State.DEAD)
 
             if state == GameLogicHandler.State.FOOD_EATEN:
-                self._player.score += config.FOOD_SCORE
+                self._player.score += run_config.food_score
 
             # bonus points
             if bonus_points:
                 new_food_dist = self._logic_handler.abs_food_dist()
-                self._player.score += config.FARTHER_FROM_FOOD_SCORE if new_food_dist >= last_food_dist else config.CLOSER_TO_FOOD_SCORE
+                self._player.score += run_config.farther_from_food_score if new_food_dist >= last_food_dist \
+                    else run_config.closer_to_food_score
                 last_food_dist = new_food_dist
 
             # draw
             self._screen.draw(self._logic_handler.board, self._player.score, turn, config.FPS, gen, alive, move)
-            clock.tick(config.FPS)
             turn += 1
 
             if not alive:
                 print(move)
                 for b in self._logic_handler.board:
                     print(b)
+
+    @staticmethod
+    def _wait_for_start():
+        """ Blocks, without using the CPU, until the user presses SPACE (or closes the window). """
+        while True:
+            event = pygame.event.wait()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                return
+            elif event.type == pygame.QUIT:
+                pygame.quit()
+                exit()
+
+    def _handle_events(self, event):
+        """ Handles the given event (pygame.NOEVENT after a timeout) and any other event in the queue. """
+        events = ([event] if event.type != pygame.NOEVENT else []) + pygame.event.get()
+        for e in events:
+            if e.type == pygame.QUIT:
+                pygame.quit()
+                exit()
+
+        if len(events) > 0:
+            self._player.handle_events(events)
@@ -0,0 +1,28 @@
+""" Tests of the recurrent (Elman) layers of neural_network/neural_network.py. """
+
+import numpy as np
+import pytest
+
+from neural_network.neural_network import NeuralNetwork
+
+
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_state_stays_finite_in_long_sequences(dtype):
+    np.random.seed(0)
+    net = NeuralNetwork([27, 32, 4], layers_activation="relu", weights_multiplier=1, dtype=dtype, recurrent=True)
+    net.layers[-1].activation = "sigmoid"
+    layer = net.layers[1]
+
+    inputs = np.random.uniform(-1, 1, size=(5000, 27)) * 10
+    for x in inputs:
+        out = net.predict(x)
+        assert np.isfinite(out).all()
+    assert np.isfinite(layer.state).all()
+    assert np.abs(layer.state).max() <= 1
+
+    # the same holds for large recurrent weights (e.g. after many mutations)
+    layer.recurrent_weights[...] = np.random.uniform(-1, 1, size=layer.recurrent_weights.shape) * 5
+    net.reset()
+    for x in inputs:
+        assert np.isfinite(net.predict(x)).all()
+    assert np.isfinite(net.predict_batch(inputs[:64])).all()
@@ -0,0 +1,73 @@
+""" Headless entry point for training a population of AI players.
+
+Only the game's logic, the neural network and the genetic algorithm are imported here, so this script runs on machines
+without a display (or without pygame installed at all). Settings not exposed as arguments are read from config.py or
+from a run configuration file (see evolution/batch_runner.py for the file formats).
+
+Usage examples:
+    python train.py --size 50 --generations 200 --base-model ./evolution/pre_trained_models/gen_99
+    python train.py --config my_run.json
+    python train.py --sweep nightly_sweep.json --cores 64
+    python train.py --base-model ./evolution/pre_trained_models/gen_99 --validate-dtype float16
+
+@author Gabriel Nogueira (Talendar)
+"""
+
+import argparse
+
+from evolution.batch_runner import BatchRunner, load_run_config, load_sweep, to_run_config
+from evolution.snake_ai import SnakePopulation, validate_brain_dtype, create_brain
+from neural_network.neural_network import NeuralNetwork
+from run_config import RunConfig
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evolves a population of snakes without opening any window.")
+    parser.add_argument("--size", type=int, default=20, help="number of individuals in the population")
+    parser.add_argument("--generations", type=int, default=25, help="number of generations to evolve")
+    parser.add_argument("--base-model", default=None, help="path to a saved model used as the initial best individual")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: CPU count)")
+    parser.add_argument("--config", default=None, help="JSON run configuration file (overrides the arguments above)")
+    parser.add_argument("--sweep", default=None, help="JSON sweep file; its runs are scheduled concurrently")
+    parser.add_argument("--cores", type=int, default=None, help="core budget shared by the runs of a sweep")
+    parser.add_argument("--out-dir", default=None, help="directory where the results will be saved")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="writes the memory usage of each generation to memory.jsonl (see evolution/memory.py)")
+    parser.add_argument("--validate-dtype", default=None,
+                        help="instead of training, reports how often the base model (or a random brain) chooses "
+                             "different actions when its weights are stored with the given data type")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    profiling = {"MEMORY_PROFILING": True} if args.profile_memory else {}
+    if args.sweep is not None:
+        runs = [dict(run, **profiling) for run in load_sweep(args.sweep)]
+        print("Scheduling %d runs..." % len(runs))
+        BatchRunner(runs, cores=args.cores, out_dir=args.out_dir).run()
+        return
+
+    size, generations, base_model, processes = args.size, args.generations, args.base_model, args.processes
+    settings = RunConfig.from_config(profiling)
+    if args.config is not None:
+        run_config = dict(load_run_config(args.config), **profiling)
+        settings = to_run_config(run_config)
+        size, generations = run_config["SIZE"], run_config["GENERATIONS"]
+        base_model = run_config.get("BASE_MODEL", base_model)
+        processes = run_config.get("PROCESSES", processes)
+
+    if args.validate_dtype is not None:
+        brain = NeuralNetwork.load(base_model) if base_model is not None else create_brain(run_config=settings)
+        divergence, turns = validate_brain_dtype(brain, args.validate_dtype, run_config=settings)
+        print("Chosen actions diverged from float64 in %.3f%% of %d turns." % (100*divergence, turns))
+        return
+
+    pop = SnakePopulation(size=size,
+                          pre_trained_brain=(None if base_model is None else NeuralNetwork.load(base_model)),
+                          out_dir=args.out_dir, processes=processes, run_config=settings)
+    pop.evolve(generations)
+
+
+if __name__ == "__main__":
+    main()